@@ -4,12 +4,17 @@ Module: jelephant.analysis.rate_estimation
 Contains utility functions for instantaneous rate estimation of SpikeTrains.
 '''
 
+import collections
+import threading
+
 import quantities as pq
 import numpy as np
 import numpy
 import scipy.signal
 import neo
 
+import elephant.rep as rep
+
 #def make_kernel(form, sigma, resolution, direction=1):
 #
 #
@@ -109,7 +114,7 @@ import neo
 #        w = 2.0 * SI_sigma * np.sqrt(3)
 #        width = 2 * np.floor(w / 2.0 / SI_time_stamp_resolution) + 1  # always odd number of bins
 #        height = 1. / width
-#        kernel = np.ones((1, width)) * height  # area = 1
+#        kernel = np.ones((1, int(width))) * height  # area = 1
 #
 #    elif form.upper() == 'TRI':
 #        w = 2 * SI_sigma * np.sqrt(6)
@@ -255,7 +260,73 @@ import neo
 
 #adaptation to output neo.AnalogSignal and wapper make_kernel() in
 #instantaneous_rate()
-def make_kernel(form, sigma, resolution, direction=1):
+#: Statistics of the kernel cache of make_kernel(), see kernel_cache_info()
+KernelCacheInfo = collections.namedtuple(
+    'KernelCacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Least recently used kernels of make_kernel(), the most recent one last
+_kernel_cache = collections.OrderedDict()
+_kernel_cache_stats = {'hits': 0, 'misses': 0, 'maxsize': 128}
+_kernel_cache_lock = threading.Lock()
+
+
+def kernel_cache_info():
+    """
+    Returns the statistics of the kernel cache of make_kernel().
+
+    Returns
+    -------
+    info : KernelCacheInfo
+        named tuple (hits, misses, maxsize, currsize) with the number of
+        calls of make_kernel() served from the cache (hits) and computing
+        the kernel (misses) since the last kernel_cache_clear(), the maximum
+        and the current number of cached kernels.
+    """
+    with _kernel_cache_lock:
+        return KernelCacheInfo(
+            _kernel_cache_stats['hits'], _kernel_cache_stats['misses'],
+            _kernel_cache_stats['maxsize'], len(_kernel_cache))
+
+
+def kernel_cache_clear(maxsize=None):
+    """
+    Empties the kernel cache of make_kernel() and resets its statistics.
+
+    Parameters
+    ----------
+    maxsize : int or None (optional)
+        if not None, the new maximum number of cached kernels (0 disables
+        the cache).
+        Default: None
+    """
+    with _kernel_cache_lock:
+        _kernel_cache.clear()
+        _kernel_cache_stats['hits'] = 0
+        _kernel_cache_stats['misses'] = 0
+        if maxsize is not None:
+            _kernel_cache_stats['maxsize'] = maxsize
+
+
+# Factors converting magnitudes of each time unit into seconds
+_seconds_factors = {}
+
+
+def _to_seconds(time):
+    """
+    Magnitude of the time Quantity in seconds, a float or an array. The
+    conversion factor of each unit is computed once, as rescaling quantities
+    is much slower than looking up the kernel cache.
+    """
+    key = time.dimensionality.string
+    if key not in _seconds_factors:
+        _seconds_factors[key] = float(
+            pq.Quantity(1.0, time.units).rescale('s').magnitude)
+    if np.ndim(time) > 0:
+        return time.magnitude * _seconds_factors[key]
+    return float(time.magnitude) * _seconds_factors[key]
+
+
+def make_kernel(form, sigma, resolution, direction=1, cache=True):
     """Creates kernel functions for convolution.
 
     Constructs a numeric linear convolution kernel of basic shape to be used
@@ -289,6 +360,11 @@ def make_kernel(form, sigma, resolution, direction=1):
         definition here is that for direction = 1 the
         kernel represents the impulse response function
         of the linear filter. Default value is 1.
+    cache : bool
+        If True, the kernel is looked up in (and stored into) a cache of
+        the least recently used kernels, keyed by the form, sigma and
+        resolution in seconds and the direction. See kernel_cache_info()
+        and kernel_cache_clear(). Default value is True.
 
     Returns
     -------
@@ -297,7 +373,9 @@ def make_kernel(form, sigma, resolution, direction=1):
         number to represent symmetric kernels such that the center bin
         coincides with the median of the numeric array, i.e for a
         triangle, the maximum will be at the center bin with equal
-        number of bins to the right and to the left.
+        number of bins to the right and to the left. The array is
+        read-only, as it is shared by all calls returning it from the
+        cache.
    norm : float
         For rate estimates. The kernel vector is normalized such that
         the sum of all entries equals unity sum(kernel)=1. When
@@ -344,9 +422,37 @@ def make_kernel(form, sigma, resolution, direction=1):
     assert direction in (1, -1), "direction must be either 1 or -1"
 
     # conversion to SI units (s)
-    SI_sigma = sigma.rescale('s').magnitude
-    SI_time_stamp_resolution = resolution.rescale('s').magnitude
+    SI_sigma = _to_seconds(sigma)
+    SI_time_stamp_resolution = _to_seconds(resolution)
+    if form.upper() not in ('EXP', 'ALP'):
+        direction = 1
 
+    if not cache or _kernel_cache_stats['maxsize'] <= 0:
+        return _make_kernel(form.upper(), SI_sigma, SI_time_stamp_resolution,
+                            direction)
+
+    key = (form.upper(), SI_sigma, SI_time_stamp_resolution, direction)
+    with _kernel_cache_lock:
+        if key in _kernel_cache:
+            _kernel_cache_stats['hits'] += 1
+            result = _kernel_cache.pop(key)
+            _kernel_cache[key] = result
+            return result
+        _kernel_cache_stats['misses'] += 1
+    result = _make_kernel(*key)
+    with _kernel_cache_lock:
+        _kernel_cache[key] = result
+        while len(_kernel_cache) > _kernel_cache_stats['maxsize']:
+            _kernel_cache.popitem(last=False)
+    return result
+
+
+def _make_kernel(form, SI_sigma, SI_time_stamp_resolution, direction):
+    """
+    Computes the kernel of make_kernel() for the upper-case form, sigma and
+    resolution in seconds and the direction. Returns (kernel, norm, m_idx)
+    with a read-only kernel array.
+    """
     norm = 1./SI_time_stamp_resolution
 
     if form.upper() == 'BOX':
@@ -354,7 +460,7 @@ def make_kernel(form, sigma, resolution, direction=1):
         # always odd number of bins
         width = 2 * np.floor(w / 2.0 / SI_time_stamp_resolution) + 1
         height = 1. / width
-        kernel = np.ones((1, width)) * height  # area = 1
+        kernel = np.ones((1, int(width))) * height  # area = 1
 
     elif form.upper() == 'TRI':
         w = 2 * SI_sigma * np.sqrt(6)
@@ -405,12 +511,14 @@ def make_kernel(form, sigma, resolution, direction=1):
 
     kernel = kernel.ravel()
     m_idx = np.nonzero(kernel.cumsum() >= 0.5)[0].min()
+    kernel.flags.writeable = False
 
     return kernel, norm, m_idx
 
 
 def instantaneous_rate(spiketrain, resolution, form, sigma, m_idx=None,
-                       t_start=None, t_stop=None, acausal=True, trim=False):
+                       t_start=None, t_stop=None, acausal=True, trim=False,
+                       method='auto'):
 
     """
     Estimate instantaneous firing rate by kernel convolution.
@@ -457,12 +565,56 @@ def instantaneous_rate(spiketrain, resolution, form, sigma, m_idx=None,
         are discarded
         NOTE: if True and an assymetrical kernel is provided
         the output will not be aligned with [t_start, t_stop]
+    method : str (optional)
+        algorithm used to convolve the spike train with the kernel. Can be
+        one of:
+        * 'fft': the binned spike train is convolved via FFT. The cost
+          only depends on the number of bins.
+        * 'sparse': the kernel, shifted to each bin with spikes, is added
+          to the rate. The cost and memory are proportional to the number
+          of spikes times the kernel size (plus the size of the result),
+          which is optimal for low rates at fine resolution.
+        * 'auto': chooses 'sparse' if the number of spikes times the kernel
+          size is below the number of bins, else 'fft'.
+        Default: 'auto'
 
     See also:
         analysis.make_kernel
     """
     kernel, norm, m_idx = make_kernel(
         form=form, sigma=sigma, resolution=resolution)
+    bins, num_bins, t_start = _bin_spiketrain(
+        spiketrain, resolution, t_start, t_stop)
+
+    if m_idx is None:
+        m_idx = kernel.size / 2
+
+    if trim is False:
+        first, last = m_idx, num_bins - 1 + m_idx
+    else:
+        first, last = 2 * m_idx, num_bins - 1 - kernel.size + 2 * m_idx
+        t_start = t_start + m_idx * t_start.units
+    r = np.zeros((max(last - first, 0), 1))
+    _convolve_bins([bins], num_bins, kernel, first, last, r, method)
+    r *= norm
+    r = r[:, 0]
+
+    # acausal=False gives the same rate as acausal=True
+    rate = neo.AnalogSignal(
+        signal=r,  sampling_period=resolution, units=pq.Hz,
+        t_start=t_start)
+    return rate
+
+
+def _bin_spiketrain(spiketrain, resolution, t_start, t_stop):
+    """
+    Supplementary function of instantaneous_rate(): bins the spike train
+    between t_start and t_stop (the spike train's if None) with bin width
+    resolution, spikes at t_stop falling into an additional last bin.
+
+    Returns the sorted indices of the bins with spikes, the number of bins
+    and t_start in units of resolution (a CompoundUnit).
+    """
     units = pq.CompoundUnit("%s*s" % str(resolution.rescale('s').magnitude))
     spiketrain = spiketrain.rescale(units)
     if t_start is None:
@@ -475,51 +627,514 @@ def instantaneous_rate(spiketrain, resolution, form, sigma, m_idx=None,
     else:
         t_stop = t_stop.rescale(spiketrain.units)
 
-    if m_idx is None:
-        m_idx = kernel.size / 2
-
-    time_vector = numpy.zeros(int((t_stop - t_start)) + 1)
+    num_bins = int((t_stop - t_start)) + 1
 
-    spikes_slice = []
+    bins = np.zeros(0, dtype=int)
     if len(spiketrain):
         spikes_slice = spiketrain.time_slice(t_start, t_stop)
+        bins = np.unique(
+            (spikes_slice.magnitude - t_start.magnitude).astype(int))
+    return bins, num_bins, t_start
+
+
+def instantaneous_rates(spiketrains, resolution, form, sigma, t_start=None,
+                        t_stop=None, acausal=True, trim=False, method='auto'):
+    """
+    Estimate the instantaneous firing rates of many spike trains at once by
+    kernel convolution.
+
+    All spike trains are binned into the columns of one 2D array, which is
+    convolved with the kernel along the time axis in the frequency domain,
+    so that each column equals the rate returned by instantaneous_rate()
+    for the same spike train and parameters.
+
+    Parameters
+    -----------
+    spiketrains : list of neo.SpikeTrain or binned_st
+        spike trains whose rates are estimated. A binned_st is convolved
+        with its clipped (0/1) binned spike trains, its binsize being the
+        resolution.
+    resolution : Quantity or None
+        time stamp resolution of the spike times. the same resolution will
+        be assumed for the kernel. If spiketrains is a binned_st, None or
+        its binsize.
+    form : {'BOX', 'TRI', 'GAU', 'EPA', 'EXP', 'ALP'}
+        Kernel form, see make_kernel().
+    sigma : Quantity
+        Standard deviation of the distribution associated with kernel shape,
+        see make_kernel().
+    t_start : Quantity (Optional)
+        start time of the interval used to compute the firing rates, if None
+        assumed equal to the t_start of the spike trains, which then must be
+        the same for all of them. Ignored for a binned_st.
+        Default:None
+    t_stop : Quantity (Optional)
+        End time of the interval used to compute the firing rates (included).
+        If None assumed equal to the t_stop of the spike trains, which then
+        must be the same for all of them. Ignored for a binned_st.
+        Default:None
+    acausal : bool
+        see instantaneous_rate()
+        Default:True
+    trim : bool
+        if True, only the 'valid' region of the convolved signals is
+        returned, see instantaneous_rate()
+        Default:False
+    method : {'auto', 'fft', 'sparse'}
+        algorithm used to convolve the spike trains with the kernel, see
+        instantaneous_rate(). 'auto' compares the total number of spikes
+        times the kernel size with the total number of bins.
+        Default:'auto'
+
+    Returns
+    -------
+    rates : neo.AnalogSignalArray
+        the firing rates in Hz, with one channel (column) per spike train.
+
+    See also:
+        instantaneous_rate, make_kernel
+    """
+    if isinstance(spiketrains, rep.binned_st):
+        if resolution is None:
+            resolution = spiketrains.binsize
+        elif _to_seconds(resolution) != _to_seconds(spiketrains.binsize):
+            raise ValueError("resolution must be the binsize of the "
+                             "binned_st")
+    kernel, norm, m_idx = make_kernel(
+        form=form, sigma=sigma, resolution=resolution)
+    units = pq.CompoundUnit("%s*s" % str(resolution.rescale('s').magnitude))
+
+    factors = {}
+
+    def magnitude(time):
+        # magnitude of time in units, rescaled as in instantaneous_rate()
+        key = time.dimensionality.string
+        if key not in factors:
+            factors[key] = float(
+                pq.Quantity(1.0, time.units).rescale(units).magnitude)
+        return time.magnitude * factors[key]
+
+    if isinstance(spiketrains, rep.binned_st):
+        # the extra last bin stands for spikes at t_stop, which are excluded
+        # from the binned_st
+        t_start = float(magnitude(spiketrains.t_start))
+        num_bins = spiketrains.num_bins + 1
+        csr = spiketrains.to_sparse(clip=True)
+        num_trains = csr.shape[0]
+        bins = [csr.indices[csr.indptr[i]:csr.indptr[i + 1]]
+                for i in range(num_trains)]
+    else:
+        if len(spiketrains) == 0:
+            raise ValueError("spiketrains must not be empty")
+        if t_start is None:
+            starts = [magnitude(st.t_start) for st in spiketrains]
+            if not np.allclose(starts, starts[0]):
+                raise ValueError("the spike trains have different t_start, "
+                                 "t_start must be given")
+            t_start = float(starts[0])
+        else:
+            t_start = float(magnitude(t_start))
+        if t_stop is None:
+            stops = [magnitude(st.t_stop) for st in spiketrains]
+            if not np.allclose(stops, stops[0]):
+                raise ValueError("the spike trains have different t_stop, "
+                                 "t_stop must be given")
+            t_stop = float(stops[0])
+        else:
+            t_stop = float(magnitude(t_stop))
+        num_bins = int(t_stop - t_start) + 1
+        num_trains = len(spiketrains)
+        bins = []
+        for st in spiketrains:
+            times = magnitude(st)
+            times = times[(times >= t_start) & (times <= t_stop)]
+            bins.append(np.unique((times - t_start).astype(int)))
+
+    if trim:
+        first, last = 2 * m_idx, num_bins - 1 - kernel.size + 2 * m_idx
+    else:
+        first, last = m_idx, num_bins - 1 + m_idx
+    rates = np.zeros((max(last - first, 0), num_trains))
+    _convolve_bins(bins, num_bins, kernel, first, last, rates, method)
+    rates *= norm
+
+    t_start = t_start * units
+    if trim:
+        t_start = t_start + m_idx * units
+    return neo.AnalogSignalArray(
+        signal=rates, sampling_period=resolution, units=pq.Hz,
+        t_start=t_start)
+
+
+def _convolve_bins(bins, num_bins, kernel, first, last, out, method='auto'):
+    """
+    Supplementary function of instantaneous_rate(s)(): writes the samples
+    first:last of the full convolution of the kernel with each 0/1 spike
+    train of num_bins bins, given by the sorted unique indices of its bins
+    with spikes, into the columns of out, with the method 'fft', 'sparse'
+    or 'auto' (see instantaneous_rate()).
+    """
+    if method == 'auto':
+        num_spikes = sum(len(b) for b in bins)
+        if num_spikes * kernel.size < num_bins * len(bins):
+            method = 'sparse'
+        else:
+            method = 'fft'
+    if method == 'sparse':
+        _convolve_bins_sparse(bins, kernel, first, last, out)
+    elif method == 'fft':
+        _convolve_bins_fft(bins, num_bins, kernel, first, last, out)
+    else:
+        raise ValueError(
+            'method (%s) can be one of the following strings: "auto", '
+            '"fft", "sparse".' % str(method))
+
+
+def _convolve_bins_fft(bins, num_bins, kernel, first, last, out):
+    """
+    The 'fft' method of _convolve_bins(): the spike trains are convolved in
+    blocks of columns with the Fourier transform of the kernel computed
+    once.
+    """
+    if out.size == 0:
+        return
+    nfft = _fft_len(num_bins + kernel.size - 1)
+    kernel_fft = np.fft.rfft(kernel, nfft)[:, np.newaxis]
+    block = max(1, (1 << 22) // nfft)
+    for i in range(0, len(bins), block):
+        ids = bins[i:i + block]
+        lengths = [len(b) for b in ids]
+        time_matrix = np.zeros((nfft, len(ids)))
+        if sum(lengths):
+            time_matrix[np.concatenate(ids),
+                        np.repeat(np.arange(len(ids)), lengths)] = 1
+        out[:, i:i + len(ids)] = np.fft.irfft(
+            np.fft.rfft(time_matrix, axis=0) * kernel_fft, nfft,
+            axis=0)[first:last]
+
+
+def _fft_len(n):
+    """
+    Smallest length >= n with prime factors 2, 3 and 5 only, for which
+    FFTs are fast.
+    """
+    best = 1 << int(np.ceil(np.log2(max(n, 1))))
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def _convolve_bins_sparse(bins, kernel, first, last, out):
+    """
+    The 'sparse' method of _convolve_bins(): the kernel is added to each
+    column at the bins with spikes, for blocks of spikes such that the
+    shifted kernels hold about 2**22 samples.
+    """
+    length = last - first
+    if length <= 0:
+        return
+    offsets = np.arange(kernel.size) - first
+    block = max(1, (1 << 22) // kernel.size)
+    for column, spikes in enumerate(bins):
+        for i in range(0, len(spikes), block):
+            positions = (np.asarray(spikes[i:i + block])[:, np.newaxis] +
+                         offsets).ravel()
+            weights = np.tile(kernel, len(positions) // kernel.size)
+            inside = (positions >= 0) & (positions < length)
+            out[:, column] += np.bincount(
+                positions[inside], weights=weights[inside], minlength=length)
+
+
+def bandwidth_cost(spiketrain, resolution, form, sigmas, t_start=None,
+                   t_stop=None):
+    """
+    Cost function of the kernel bandwidth (sigma) of instantaneous_rate()
+    for a spike train, as defined by Shimazaki and Shinomoto [1]_.
+
+    The cost is an estimate (up to a constant) of the integrated squared
+    error between the estimated and the unknown underlying rate,
+
+        ``C(sigma) = int r(t)**2 dt - 2 * sum_i r_i(t_i)``
+
+    where r is the rate estimated with the kernel of bandwidth sigma, and
+    r_i the rate estimated without the i-th spike, evaluated at the time t_i
+    of the i-th spike. The bandwidth minimizing the cost is optimal.
+
+    Both terms only depend on the autocorrelation of the binned spike train
+    (the number of pairs of spikes at each distance), which is computed
+    once for all bandwidths, and on the kernel, so that the cost of each
+    bandwidth does not depend on the duration of the spike train. The
+    binned spike train is convolved over the whole time axis (as the
+    untrimmed rate of instantaneous_rate()).
+
+    Parameters
+    ----------
+    spiketrain : neo.SpikeTrain
+        the spike train
+    resolution : Quantity
+        time stamp resolution of the spike times, see instantaneous_rate()
+    form : {'BOX', 'TRI', 'GAU', 'EPA', 'EXP', 'ALP'}
+        Kernel form, see make_kernel().
+    sigmas : Quantity array
+        the bandwidths (standard deviations of the kernel) to evaluate
+    t_start, t_stop : Quantity (optional)
+        the interval of the spike train to use, see instantaneous_rate().
+        Default: None
+
+    Returns
+    -------
+    costs : ndarray
+        the cost of each bandwidth, in Hz.
+
+    See also:
+        optimal_instantaneous_rate
+
+    .. [1] Shimazaki H, Shinomoto S, "Kernel bandwidth optimization in spike
+       rate estimation"; J Comput Neurosci 2010; 29(1-2):171-82.
+    """
+    bins, num_bins, _ = _bin_spiketrain(
+        spiketrain, resolution, t_start, t_stop)
+    kernels = [make_kernel(form, sigma, resolution) for sigma in sigmas]
+    maxlag = max(kernel.size for kernel, _, _ in kernels) - 1
+    pairs = _bins_autocorrelation(bins, num_bins, maxlag)
+
+    costs = np.zeros(len(kernels))
+    for i, (kernel, norm, m_idx) in enumerate(kernels):
+        size = kernel.size
+        # autocorrelation of the kernel at lags 0, ..., size - 1
+        psi = scipy.signal.fftconvolve(kernel, kernel[::-1])[size - 1:]
+        squares = pairs[0] * psi[0] + 2 * np.dot(pairs[1:size], psi[1:])
+        # pairs of distinct spikes at lags d > 0 and -d
+        cross = np.dot(pairs[1:size - m_idx], kernel[m_idx + 1:]) + np.dot(
+            pairs[1:m_idx + 1], kernel[:m_idx][::-1])
+        costs[i] = norm * (squares - 2 * cross)
+    return costs
+
+
+def _bins_autocorrelation(bins, num_bins, maxlag):
+    """
+    Supplementary function of bandwidth_cost(): number of pairs of bins
+    with spikes at each distance 0, ..., maxlag, given the sorted indices
+    of the bins with spikes. The pairs are counted directly if they are
+    few, else the autocorrelation is computed via FFT.
+    """
+    num_spikes = len(bins)
+    num_pairs = num_spikes * (
+        num_spikes * (maxlag + 1.) / max(num_bins, 1) + 1)
+    nfft = _fft_len(num_bins + maxlag)
+    if 4 * num_pairs < nfft * np.log2(max(nfft, 2)):
+        pairs = np.zeros(maxlag + 1)
+        pairs[0] = num_spikes
+        # the distances bins[i + shift] - bins[i] increase with shift
+        for shift in range(1, num_spikes):
+            distances = bins[shift:] - bins[:-shift]
+            distances = distances[distances <= maxlag]
+            if distances.size == 0:
+                break
+            pairs += np.bincount(distances, minlength=maxlag + 1)
+        return pairs
+    time_vector = np.zeros(nfft)
+    time_vector[bins] = 1
+    spectrum = np.fft.rfft(time_vector)
+    return np.rint(np.fft.irfft(
+        spectrum.real ** 2 + spectrum.imag ** 2, nfft)[:maxlag + 1])
+
+
+def optimal_instantaneous_rate(spiketrain, resolution, form='GAU',
+                               sigmas=None, t_start=None, t_stop=None,
+                               acausal=True, trim=False, method='auto'):
+    """
+    Estimate the instantaneous firing rate by kernel convolution with the
+    kernel bandwidth (sigma) minimizing bandwidth_cost().
+
+    Parameters
+    ----------
+    spiketrain : neo.SpikeTrain
+        the spike train
+    resolution : Quantity
+        time stamp resolution of the spike times, see instantaneous_rate()
+    form : {'BOX', 'TRI', 'GAU', 'EPA', 'EXP', 'ALP'}
+        Kernel form, see make_kernel().
+        Default: 'GAU'
+    sigmas : Quantity array (optional)
+        the bandwidths among which the optimal one is chosen. If None, 50
+        logarithmically spaced bandwidths from 2 * resolution to a tenth of
+        the interval between t_start and t_stop.
+        Default: None
+    t_start, t_stop, acausal, trim, method :
+        see instantaneous_rate()
+
+    Returns
+    -------
+    sigma : Quantity
+        the optimal bandwidth
+    rate : neo.AnalogSignal
+        the rate estimated with the optimal bandwidth, see
+        instantaneous_rate()
+
+    See also:
+        bandwidth_cost, instantaneous_rate
+    """
+    if sigmas is None:
+        duration = _bin_spiketrain(
+            spiketrain, resolution, t_start, t_stop)[1] - 1
+        sigmas = resolution * np.logspace(
+            np.log10(2), np.log10(max(duration / 10., 2)), 50)
+    costs = bandwidth_cost(
+        spiketrain, resolution, form, sigmas, t_start=t_start, t_stop=t_stop)
+    sigma = sigmas[np.argmin(costs)]
+    rate = instantaneous_rate(
+        spiketrain, resolution, form, sigma, t_start=t_start, t_stop=t_stop,
+        acausal=acausal, trim=trim, method=method)
+    return sigma, rate
+
+
+class causal_rate_estimator(object):
+    """
+    Incremental estimation of the instantaneous firing rate of a spike train
+    with a causal kernel, for online use, e.g. in closed-loop experiments.
+
+    Spikes are passed in batches as they arrive, and each update returns
+    the rate at the bins completed since the previous update. The rate at
+    bin k (of width resolution, starting at t_start + k * resolution) is
+
+        ``norm * scipy.signal.lfilter(kernel, 1, spike_data)[k]``
+
+    where kernel and norm are given by make_kernel() with direction 1 and
+    spike_data is the binned (0/1) spike train, i.e. it depends on the
+    spikes up to the end of bin k only.
+
+    Both kernel forms are evaluated recursively (IIR filters of first
+    order for 'EXP' and second order for 'ALP'), with additional terms
+    removing the spikes older than the kernel size, so that the cost of an
+    update only depends on the number of its bins and spikes.
+
+    Parameters
+    ----------
+    form : {'EXP', 'ALP'}
+        Kernel form (exponential or alpha function), see make_kernel().
+    sigma : Quantity
+        Standard deviation of the kernel, see make_kernel().
+    resolution : Quantity
+        bin width of the spike train and the rate
+    t_start : Quantity (optional)
+        start time of the first bin.
+        Default: 0 s
+
+    Attributes
+    ----------
+    kernel, norm : ndarray, float
+        the kernel and the normalization factor from make_kernel()
+    t_stop : Quantity
+        time of the last update
+
+    Example
+    -------
+    >>> estimator = causal_rate_estimator('EXP', 20 * pq.ms, 1 * pq.ms)
+    >>> while recording:
+    ...     spikes, now = acquire()  # new spike times in [t_stop, now)
+    ...     rate = estimator.update(spikes, now)
+    """
+
+    def __init__(self, form, sigma, resolution, t_start=0 * pq.s):
+        form = form.upper()
+        if form not in ('EXP', 'ALP'):
+            raise ValueError("form must be either 'EXP' or 'ALP'")
+        self.form = form
+        self.sigma = sigma
+        self.resolution = resolution
+        self.t_start = t_start
+        self.t_stop = t_start
+        self.kernel, self.norm, _ = make_kernel(
+            form, sigma, resolution, direction=1)
+
+        SI_sigma = _to_seconds(sigma)
+        self._resolution = _to_seconds(resolution)
+        self._t_start = _to_seconds(t_start)
+        self._t_stop = self._t_start
+        # resolution in units of t_start, for the t_start of the rates
+        self._step = float(resolution.rescale(t_start.units).magnitude)
+        size = self.kernel.size
+        c = self.kernel[0]
+        # kernel[j] = c * a**j (EXP) or c * (j + 1) * a**j (ALP) for j < size,
+        # the taps at offsets >= size cancel the response beyond the kernel
+        if form == 'EXP':
+            a = np.exp(-self._resolution / SI_sigma)
+            self._taps = [(0, c), (size, -c * a ** size)]
+            self._denominator = np.array([1., -a])
+        else:
+            a = np.exp(-self._resolution * np.sqrt(2) / SI_sigma)
+            self._taps = [(0, c), (size, -c * (size + 1) * a ** size),
+                          (size + 1, c * size * a ** (size + 1))]
+            self._denominator = np.array([1., -2 * a, a * a])
+        self._state = np.zeros(self._denominator.size - 1)
+        self._num_bins = 0
+        # sorted bins with spikes, which are still needed for the taps
+        self._spike_bins = np.zeros(0, dtype=int)
+
+    def update(self, spikes, t_stop):
+        """
+        Adds a batch of spikes and returns the rate at the bins completed
+        until t_stop.
+
+        Parameters
+        ----------
+        spikes : Quantity array or neo.SpikeTrain
+            the new spike times, which must lie between the previous
+            t_stop (included) and t_stop (excluded).
+        t_stop : Quantity
+            the current time. Spikes of the bin containing t_stop may
+            still be added by the next update.
+
+        Returns
+        -------
+        rate : neo.AnalogSignal
+            the rate in Hz at the bins completed since the previous update
+            (possibly none).
+        """
+        SI_t_stop = _to_seconds(t_stop)
+        if SI_t_stop < self._t_stop:
+            raise ValueError("t_stop must not be before the previous t_stop")
+        times = np.zeros(0)
+        if len(spikes):
+            times = np.asarray(_to_seconds(spikes), dtype=float).ravel()
+            if times.min() < self._t_stop or times.max() >= SI_t_stop:
+                raise ValueError("the spikes must lie between the previous "
+                                 "t_stop and t_stop")
+        bins = np.floor(
+            (times - self._t_start) / self._resolution).astype(int)
+        self._spike_bins = np.union1d(self._spike_bins, bins)
+
+        start = self._num_bins
+        num_bins = max(int(np.floor(
+            (SI_t_stop - self._t_start) / self._resolution)), start)
+        spike_data = np.zeros(num_bins - start)
+        for offset, weight in self._taps:
+            positions = self._spike_bins + offset - start
+            positions = positions[
+                (positions >= 0) & (positions < spike_data.size)]
+            spike_data[positions] += weight
+        if spike_data.size:
+            r, self._state = scipy.signal.lfilter(
+                [1.], self._denominator, spike_data, zi=self._state)
+            r *= self.norm
+        else:
+            r = spike_data
 
-    for spike in spikes_slice:
-        index = int((spike - t_start))
-        time_vector[index] = 1
-
-    r = norm * scipy.signal.fftconvolve(time_vector, kernel, 'full')
-
-    if acausal is True:
-        if trim is False:
-            r = r[m_idx:-(kernel.size - m_idx)]
-            rate = neo.AnalogSignal(
-                signal=r,  sampling_period=resolution, units=pq.Hz,
-                t_start=t_start)
-            return rate
-
-        elif trim is True:
-            r = r[2 * m_idx:-2*(kernel.size - m_idx)]
-            t_start = t_start + m_idx * spiketrain.units
-            t_stop = t_stop - ((kernel.size) - m_idx) * spiketrain.units
-            rate = neo.AnalogSignal(
-                signal=r,  sampling_period=resolution, units=pq.Hz,
-                t_start=t_start)
-            return rate
-
-    if acausal is False:
-        if trim is False:
-            r = r[m_idx:-(kernel.size - m_idx)]
-            rate = neo.AnalogSignal(
-                signal=r,  sampling_period=resolution, units=pq.Hz,
-                t_start=t_start)
-            return rate
-
-        elif trim is True:
-            r = r[2 * m_idx:-2*(kernel.size - m_idx)]
-            t_start = t_start + m_idx * spiketrain.units
-            t_stop = t_stop - ((kernel.size) - m_idx) * spiketrain.units
-            rate = neo.AnalogSignal(
-                signal=r,  sampling_period=resolution, units=pq.Hz,
-                t_start=t_start)
-            return rate
+        self._num_bins = num_bins
+        self._t_stop = SI_t_stop
+        self.t_stop = t_stop
+        self._spike_bins = self._spike_bins[
+            self._spike_bins >= num_bins - self._taps[-1][0]]
+        return neo.AnalogSignal(
+            signal=r, sampling_period=self.resolution, units=pq.Hz,
+            t_start=pq.Quantity(self.t_start.magnitude + start * self._step,
+                                self.t_start.units))
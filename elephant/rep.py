@@ -1,6 +1,7 @@
 import neo.core
 import quantities as pq
 import numpy as np
+import scipy.sparse as sps
 import elephant.conditions as conditions
 
 
@@ -209,6 +210,41 @@ def calc_binsize(num_bins, t_start, t_stop):
         return (t_stop - t_start) / num_bins
 
 
+def _time_magnitudes(times):
+    """
+    Returns the magnitudes of a list of time quantities in the unit of the
+    first element. The conversion factor is resolved only once for each
+    distinct unit, which is much faster than comparing the quantities.
+
+    Parameters
+    ----------
+    times: list of quantities.Quantity
+        Scalar time quantities
+
+    Returns
+    -------
+    magnitudes : numpy.ndarray
+        Magnitudes of `times` in the unit of `times[0]`
+    """
+    unit = times[0].units
+    factors = {}
+    magnitudes = np.empty(len(times))
+    for i, t in enumerate(times):
+        key = _unit_key(t)
+        if key not in factors:
+            factors[key] = float(t.units.rescale(unit).magnitude)
+        magnitudes[i] = float(t.magnitude) * factors[key]
+    return magnitudes
+
+
+def _unit_key(q):
+    """
+    Returns a hashable key identifying the unit of the quantity `q`, which
+    is cheaper to compute than `q.units`.
+    """
+    return tuple(q.dimensionality.items())
+
+
 def set_start_stop_from_input(spiketrains):
     """
     Sets the start :attr:`t_start`and stop :attr:`t_stop` point
@@ -236,12 +272,14 @@ def set_start_stop_from_input(spiketrains):
     if isinstance(spiketrains, neo.SpikeTrain):
         return spiketrains.t_start, spiketrains.t_stop
     else:
-        start = max([elem.t_start for elem in spiketrains])
-        stop = min([elem.t_stop for elem in spiketrains])
+        t_starts = [elem.t_start for elem in spiketrains]
+        t_stops = [elem.t_stop for elem in spiketrains]
+        start = t_starts[np.argmax(_time_magnitudes(t_starts))]
+        stop = t_stops[np.argmin(_time_magnitudes(t_stops))]
     return start, stop
 
 
-class binned_st:
+class binned_st(object):
     """
     Class which calculates a binned spike train and provides methods to
     transform the binned spike train to clipped or unclipped matrix.
@@ -263,6 +301,10 @@ class binned_st:
     contain the number of spikes that occurred in the spike train(s). It counts
     the occurrence of the timing of a spike in its respective spike train.
 
+    Internally the spike counts are stored in a sparse matrix in compressed
+    sparse row (CSR) format, so that memory only scales with the number of
+    filled bins. The sparse matrix can be accessed with `to_sparse()`.
+
     Parameters
     ----------
     spiketrains : List of `neo.SpikeTrain` or a `neo.SpikeTrain` object
@@ -291,6 +333,7 @@ class binned_st:
     * from_neo()
     * matrix_clipped()
     * matrix_unclipped()
+    * to_sparse()
 
     Notes
     -----
@@ -344,7 +387,8 @@ class binned_st:
         self.__check_init_params(binsize, num_bins, self.t_start, self.t_stop)
         self.__check_consistency(spiketrains, self.binsize, self.num_bins,
                                  self.t_start, self.t_stop)
-        self.filled = []  # contains the index of the bins
+        # Sparse matrix holding the spike counts, is set together with filled
+        self._sparse_mat_u = None
         # Now create filled
         self.__convert_to_binned(spiketrains)
 
@@ -474,8 +518,8 @@ class binned_st:
                                      self.num_bins))
         t_starts = [elem.t_start for elem in spiketrains]
         t_stops = [elem.t_stop for elem in spiketrains]
-        max_tstart = max(t_starts)
-        min_tstop = min(t_stops)
+        max_tstart = t_starts[np.argmax(_time_magnitudes(t_starts))]
+        min_tstop = t_stops[np.argmin(_time_magnitudes(t_stops))]
         if max_tstart >= min_tstop:
             raise ValueError(
                 "Starting time of each spike train must be smaller than each "
@@ -515,12 +559,19 @@ class binned_st:
         Returns the binned spike train.
         Is a property.
 
+        The list is generated from the sparse matrix of spike counts, each
+        element contains the indices of the filled bins of one spike train.
+        A bin index is repeated as many times as spikes fall into the bin.
+
         Returns
         -------
-        filled : numpy.array
-            Numpy array containing binned spike train.
+        filled : list of numpy.array
+            List of numpy arrays containing binned spike train.
         """
-        return self.filled
+        mat = self._sparse_mat_u
+        return [np.repeat(mat.indices[mat.indptr[i]:mat.indptr[i + 1]],
+                          mat.data[mat.indptr[i]:mat.indptr[i + 1]])
+                for i in range(mat.shape[0])]
 
     @filled.setter
     def filled(self, f):
@@ -528,6 +579,8 @@ class binned_st:
         Setter for a new binned spike train.
 
         Sets the binned spike train array `filled` to another binned array.
+        The sparse matrix of spike counts is rebuilt from `f` and stored
+        matrices are discarded.
 
         Parameters
         ----------
@@ -535,7 +588,25 @@ class binned_st:
             Array or list which is going to replace the actual binned spike
             train.
         """
-        self.filled = f
+        f = [np.asarray(elem, dtype=int).ravel() for elem in f]
+        rows = np.repeat(np.arange(len(f)), [len(elem) for elem in f])
+        cols = np.hstack(f) if len(f) > 0 else np.array([], dtype=int)
+        self.__set_sparse_mat(rows, cols, len(f))
+
+    def __set_sparse_mat(self, rows, cols, num_rows):
+        """
+        Builds the sparse matrix of spike counts from the row (spike train)
+        and column (bin) indices of all spikes and discards stored matrices.
+        """
+        # Duplicated entries are summed up, i.e. the counts are stored
+        mat = sps.csr_matrix(
+            (np.ones(len(cols), dtype=int), (rows, cols)),
+            shape=(num_rows, self.matrix_columns))
+        mat.sort_indices()
+        self._sparse_mat_u = mat
+        self.matrix_rows = num_rows
+        self.mat_c = None
+        self.mat_u = None
 
     @property
     def edges(self):
@@ -612,6 +683,45 @@ class binned_st:
         """
         return self.left_edges + self.binsize/2
 
+    def to_sparse(self, clip=False):
+        """
+        Returns the spike counts as a sparse matrix in CSR format, which
+        rows represent the spike trains and the columns represent the bins.
+
+        Only the filled bins are stored, so that the memory consumption
+        scales with the number of filled bins instead of the number of bins.
+
+        Parameters
+        ----------
+        clip : bool
+            If set to **True** the filled bins contain ones (see
+            `matrix_clipped()`), otherwise they contain the number of spikes
+            (see `matrix_unclipped()`).
+            Default is False.
+
+        Returns
+        -------
+        sparse matrix : scipy.sparse.csr_matrix
+            Sparse integer matrix of shape (`matrix_rows`, `matrix_columns`).
+            The unclipped matrix is the internal storage of the object and
+            must not be modified in place.
+
+        Examples
+        --------
+        >>> import elephant.rep as rep
+        >>> import neo as n
+        >>> import quantities as pq
+        >>> a = n.SpikeTrain([0.5, 0.7, 1.2, 3.1, 4.3, 5.5, 6.7] * pq.s, t_stop=10.0 * pq.s)
+        >>> x = rep.binned_st(a, num_bins=10, binsize=1 * pq.s, t_start=0 * pq.s)
+        >>> print x.to_sparse().toarray()
+            [[2 1 0 1 1 1 1 0 0 0]]
+        """
+        if clip:
+            mat = self._sparse_mat_u.copy()
+            mat.data[:] = 1
+            return mat
+        return self._sparse_mat_u
+
     def matrix_clipped(self, **kwargs):
         """
         Calculates a matrix, which rows represent the number of spike trains
@@ -630,14 +740,15 @@ class binned_st:
                 memory. If the method is called again, the stored (clipped)
                 matrix will be returned.
                 If set to **False** matrix will always be calculated on demand.
+            dtype : numpy.dtype or str
+                Data type of the matrix, e.g. `numpy.uint8` for a compact
+                binary matrix.
+                Default is float.
 
         Raises
         ------
         AssertionError:
             If :attr:`store_mat` is not a Boolean an Assertion error is raised.
-        IndexError:
-            If the cols and and rows of the matrix are inconsistent, an Index
-            error is raised.
 
         Returns
         -------
@@ -661,35 +772,18 @@ class binned_st:
             if not isinstance(kwargs['store_mat'], bool):
                 raise AssertionError('store_mat is not a boolean')
             self.store_mat_c = kwargs['store_mat']
-        if self.mat_c is not None:
+        dtype = np.dtype(kwargs.get('dtype', float))
+        if self.mat_c is not None and self.mat_c.dtype == dtype:
             return self.mat_c
         # Matrix shall be stored
         if self.store_mat_c:
-            self.mat_c = np.zeros((self.matrix_rows, self.matrix_columns))
-            for elem_idx, elem in enumerate(self.filled):
-                if len(elem) != 0:
-                    try:
-                        self.mat_c[elem_idx, elem] = 1
-                    except IndexError as ie:
-                        raise IndexError(str(
-                            ie) + "\n You are trying to build a matrix which "
-                                  "is inconsistent in size. "
-                                  "Please check your input parameter.")
-                return self.mat_c
+            self.__store_matrices(
+                dtype, clipped=True,
+                unclipped=self.store_mat_u and self.mat_u is None)
+            return self.mat_c
         # Matrix on demand
         else:
-            tmp_mat = np.zeros(
-                (self.matrix_rows, self.matrix_columns))  # temporary matrix
-            for elem_idx, elem in enumerate(self.filled):
-                if len(elem) != 0:
-                    try:
-                        tmp_mat[elem_idx, elem] = 1
-                    except IndexError as ie:
-                        raise IndexError(str(
-                            ie) + "\n You are trying to build a matrix which "
-                                  "is inconsistent in size. "
-                                  "Please check your input parameter.")
-            return tmp_mat
+            return self.__fill_matrices(dtype, clipped=True)[0]
 
     def matrix_unclipped(self, **kwargs):
         """
@@ -710,6 +804,10 @@ class binned_st:
                 memory. If the method is called again, the stored (unclipped)
                 matrix will be returned.
                 If set to **False** matrix will always be calculated on demand.
+            dtype : numpy.dtype or str
+                Data type of the matrix, e.g. `numpy.uint16` or `numpy.int32`
+                for a compact matrix of spike counts.
+                Default is float.
 
         Returns
         -------
@@ -721,9 +819,8 @@ class binned_st:
         ------
         AssertionError:
             If :attr:`store_mat` is not a Boolean an Assertion error is raised.
-        IndexError:
-            If the cols and and rows of the matrix are inconsistent, an Index
-            error is raised.
+        ValueError:
+            If the spike counts do not fit into the integer type `dtype`.
 
         Examples
         --------
@@ -738,40 +835,69 @@ class binned_st:
             if not isinstance(kwargs['store_mat'], bool):
                 raise AssertionError('store_mat is not a boolean')
             self.store_mat_u = kwargs['store_mat']
-        if self.mat_u is not None:
+        dtype = np.dtype(kwargs.get('dtype', float))
+        if self.mat_u is not None and self.mat_u.dtype == dtype:
             return self.mat_u
         if self.store_mat_u:
-            self.mat_u = np.zeros((self.matrix_rows, self.matrix_columns))
-            for elem_idx, elem in enumerate(self.filled):
-                if len(elem) != 0:
-                    try:
-                        if len(elem) >= 1:
-                            for inner_elem in elem:
-                                self.mat_u[elem_idx, inner_elem] += 1
-                    except IndexError as ie:
-                        raise IndexError(str(ie) + "\n You are trying to "
-                                                   "build a matrix which is "
-                                                   "inconsistent in size. "
-                                                   "Please check your input "
-                                                   "parameter.")
+            self.__store_matrices(
+                dtype, clipped=self.store_mat_c and self.mat_c is None,
+                unclipped=True)
             return self.mat_u
         # Matrix on demand
         else:
-            tmp_mat = np.zeros((self.matrix_rows, self.matrix_columns))
-            for elem_idx, elem in enumerate(self.filled):
-                if len(elem) != 0:
-                    try:
-                        if len(elem) > 1:
-                            for inner_elem in elem:
-                                tmp_mat[elem_idx, inner_elem] += 1
-                        else:
-                            tmp_mat[elem_idx, elem[0]] += 1
-                    except IndexError as ie:
-                        raise IndexError(str(
-                            ie) + "\n You are trying to build a matrix which "
-                                  "is inconsistent in size. "
-                                  "Please check your input parameter.")
-            return tmp_mat
+            return self.__fill_matrices(dtype, unclipped=True)[1]
+
+    def __store_matrices(self, dtype, clipped=False, unclipped=False):
+        """
+        Calculates and stores the clipped and/or the unclipped matrix. If
+        both matrices are requested, they are calculated in one pass.
+        """
+        mat_c, mat_u = self.__fill_matrices(
+            dtype, clipped=clipped, unclipped=unclipped)
+        if mat_c is not None:
+            self.mat_c = mat_c
+        if mat_u is not None:
+            self.mat_u = mat_u
+
+    def __fill_matrices(self, dtype, clipped=False, unclipped=False):
+        """
+        Calculates the clipped and/or the unclipped dense matrix from the
+        sparse matrix of spike counts.
+
+        All filled bins of all spike trains are addressed by one flattened
+        index (row offset plus bin index) into the matrices, so that the
+        matrices are filled without looping over spike trains or spikes.
+
+        Parameters
+        ----------
+        dtype : numpy.dtype
+            Data type of the matrices
+        clipped, unclipped : bool
+            Whether to calculate the clipped and unclipped matrix,
+            respectively.
+
+        Returns
+        -------
+        (mat_c, mat_u) : tuple of numpy.ndarray
+            The clipped and unclipped matrix, `None` if not requested.
+        """
+        mat = self._sparse_mat_u
+        if unclipped and mat.nnz > 0 and np.issubdtype(dtype, np.integer) \
+                and mat.data.max() > np.iinfo(dtype).max:
+            raise ValueError(
+                "Spike counts up to %d do not fit into the data type %s"
+                % (mat.data.max(), dtype))
+        shape = (self.matrix_rows, self.matrix_columns)
+        rows = np.repeat(np.arange(mat.shape[0]), np.diff(mat.indptr))
+        flat_idx = rows * self.matrix_columns + mat.indices
+        mat_c, mat_u = None, None
+        if clipped:
+            mat_c = np.zeros(shape, dtype=dtype)
+            mat_c.flat[flat_idx] = 1
+        if unclipped:
+            mat_u = np.zeros(shape, dtype=dtype)
+            mat_u.flat[flat_idx] = mat.data
+        return mat_c, mat_u
 
     def __convert_to_binned(self, spiketrains):
         """
@@ -797,11 +923,37 @@ class binned_st:
         >>> print x.filled
             [array([0, 0, 1, 3, 4, 5, 6])]
         """
+        # Resolve the units once for each distinct unit of the spike trains
+        # (usually a single one): the offset t_start in that unit and the
+        # scale factor to the unit of the bin size
+        offsets, factors, keys = {}, {}, []
         for elem in spiketrains:
-            idx_filled = np.array(
-                ((elem.view(pq.Quantity) - self.t_start).rescale(
-                    self.binsize.units) / self.binsize).magnitude, dtype=int)
-            self.filled.append(idx_filled[idx_filled < self.num_bins])
+            key = _unit_key(elem)
+            if key not in factors:
+                factors[key] = float(elem.units.rescale(
+                    self.binsize.units).magnitude)
+                offsets[key] = float(
+                    self.t_start.rescale(elem.units).magnitude)
+            keys.append(key)
+        if len(factors) == 1:
+            offset, factor = offsets[keys[0]], factors[keys[0]]
+        else:
+            lengths = [len(elem) for elem in spiketrains]
+            offset = np.repeat([offsets[key] for key in keys], lengths)
+            factor = np.repeat([factors[key] for key in keys], lengths)
+
+        # Bin the raw magnitudes of all spike trains at once
+        times = np.concatenate(
+            [elem.magnitude.ravel() for elem in spiketrains])
+        rows = np.repeat(np.arange(len(spiketrains)),
+                         [len(elem) for elem in spiketrains])
+        idx_filled = (times - offset) * factor / float(self.binsize.magnitude)
+        # Spikes before t_start are not part of any bin
+        in_range = idx_filled >= 0
+        rows, idx_filled = rows[in_range], idx_filled[in_range].astype(int)
+        in_range = idx_filled < self.num_bins
+        self.__set_sparse_mat(rows[in_range], idx_filled[in_range],
+                              len(spiketrains))
 
     def prune(self):
         """
@@ -887,7 +1039,8 @@ class binned_st:
         # For merged spiketrains, or when filled has more than one binned
         # spiketrain
         if len(self.filled) > 1 or len(other.filled) > 1:
-            new_class.filled = [self.filled, other.filled]
+            new_class.filled = [np.hstack((s, o)) for s, o in
+                                zip(self.filled, other.filled)]
         else:
             new_class.filled = np.hstack((self.filled, other.filled))
         return new_class
@@ -961,8 +1114,6 @@ class binned_st:
         The input SpikeTrain is altered!
 
         """
-        import itertools
-
         new_class = self.new_class = self.create_class(self.t_start,
                                                        self.t_stop,
                                                        self.binsize,
@@ -971,15 +1122,15 @@ class binned_st:
         # The cols and rows have to be equal to the rows and cols of self
         # and other.
         new_class.matrix_columns = self.matrix_columns
-        new_class.matrix_rows = self.matrix_rows
+        filled = []
         if len(self.filled) > 1 or len(other.filled) > 1:
-            for s, o in itertools.izip(self.filled, other.filled):
-                new_class.filled.append(np.array(list(set(s) ^ set(o))))
+            for s, o in zip(self.filled, other.filled):
+                filled.append(np.array(list(set(s) ^ set(o))))
         else:
-            new_class.filled.append(
-                np.setxor1d(self.filled[0], other.filled[0]))
-            if not len(new_class.filled[0] > 0):
-                new_class.filled[0] = np.zeros(len(self.filled[0]))
+            filled.append(np.setxor1d(self.filled[0], other.filled[0]))
+            if not len(filled[0] > 0):
+                filled[0] = np.zeros(len(self.filled[0]))
+        new_class.filled = filled
         return new_class
 
     def __isub__(self, other):
@@ -1027,7 +1178,7 @@ class binned_st:
         # Create a new dummy class to return
         new_class = cls(spk, t_start=start, t_stop=stop, binsize=binsize)
         # Clear the filed list, which is created when creating an instance
-        del new_class.filled[:]
+        new_class.filled = []
         # The cols and rows has to be equal to the rows and cols of self
         # and other.
         new_class.matrix_rows = mat_row
@@ -1255,14 +1406,18 @@ def transactions(spiketrains, binsize, t_start=None, t_stop=None, ids=[]):
     else:
         stop = t_stop
 
-    # Bin the spike trains and take for each of them the ids of filled bins
+    # Bin the spike trains and take for each bin the ids of the spike trains
+    # having a spike in it (column-wise access of the sparse matrix)
     binned = binned_st(
         trains, binsize=binsize, t_start=start, t_stop=stop)
+    mat = binned.to_sparse(clip=True).tocsc()
+    mat.sort_indices()
 
     # Compute and return the transaction list. Note that each spike train
     # is implicitly binned!
-    return [[train_id for train_id, b in zip(ids, binned.filled) if bin_id
-        in b] for bin_id in xrange(binned.num_bins)]
+    return [[ids[train_idx] for train_idx in
+             mat.indices[mat.indptr[bin_id]:mat.indptr[bin_id + 1]]]
+            for bin_id in range(binned.num_bins)]
 
 
 def st_to_operation_time(st, rate):
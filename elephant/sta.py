@@ -6,8 +6,11 @@ Contains functions to calculate spike-triggered averages of AnalogSignals.
 '''
 
 
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
-import scipy.signal
+from numpy.lib.stride_tricks import as_strided
 import quantities as pq
 from neo.core import AnalogSignal, AnalogSignalArray
 
@@ -20,13 +23,15 @@ if __name__ == '__main__':
 #===============================================================================
 # Spike-triggered average main functions
 #===============================================================================
-def sta(lfps, spiketrains, window, method="correlation", crosstrials=False, single_data=None):
+def sta(lfps, spiketrains, window, method="correlation", crosstrials=False, single_data=None, n_jobs=1):
     """
     Calls the resective sta function specified by 'method'. 'method' can either be 'correlation' for
     correlation-based STA calculation or 'average' for average-based STA calculation.
 
     **Args**:
         lfps: AnalogSignal object or AnalogSignalArray object or list of AnalogSignals
+            An AnalogSignalArray (samples x channels) is taken as multiple channels of one
+            trial, for which the STAs of all channels are calculated at once
         spikes: SpikeTrain or list of SpikeTrains objects, its time intervall needs to
             be completely covered by the lfp
         window: positive time interval to specify the cutout around spikes given as Quantity or
@@ -40,12 +45,15 @@ def sta(lfps, spiketrains, window, method="correlation", crosstrials=False, sing
             specifies whether one (first) spiketrain is used for all STAs ('train'),
             each AnalogSignal comes with its own spiketrain (None, Default) or one (first)
             Analogsignal is used for all spiketrains ('lfp') Default value 'None'
+        n_jobs: number of threads among which the trials are distributed (-1 for all CPUs).
+            Default value 1
 
     **Return**:
         Returns a tuple (STA,time,used_spikes), where STA is a list of one-dimensional arrays with
         the spike triggered average, and time is a list of the corresponding time bins.
         The length of the respective array is defined by 2*window + 1, where window is
-        the number of bins around the spike times used.
+        the number of bins around the spike times used. For multiple channels, the STA is a
+        two-dimensional array (channels x bins).
         used_spikes contains the number of spikes used for the STA. If the spiketrain did
         not contain suitable spikes, the returned STA will be filled with zeros.
 
@@ -86,9 +94,9 @@ def sta(lfps, spiketrains, window, method="correlation", crosstrials=False, sing
         result = []
         for i in range(loops):
             if method == "corr" or method == "correlation":
-                result.append(sta_corr(lfps, spiketrains[i], window, crosstrials, single_data))
+                result.append(sta_corr(lfps, spiketrains[i], window, crosstrials, single_data, n_jobs=n_jobs))
             elif method == "aver" or method == "average":
-                result.append(sta_average(lfps, spiketrains[i], window, crosstrials, single_data))
+                result.append(sta_average(lfps, spiketrains[i], window, crosstrials, single_data, n_jobs=n_jobs))
             else:
                 raise ValueError("Specified STA method is not available. Please use 'correlation' or 'average'")
 
@@ -100,9 +108,9 @@ def sta(lfps, spiketrains, window, method="correlation", crosstrials=False, sing
 
     # ## 2 ### normal calling of sta function in case of single_data != 'lfp'
     if method == "corr" or method == "correlation":
-        return (sta_corr(lfps, spiketrains, window, crosstrials, single_data))
+        return (sta_corr(lfps, spiketrains, window, crosstrials, single_data, n_jobs=n_jobs))
     elif method == "aver" or method == "average":
-        return (sta_average(lfps, spiketrains, window, crosstrials, single_data))
+        return (sta_average(lfps, spiketrains, window, crosstrials, single_data, n_jobs=n_jobs))
     else:
         raise ValueError("Specified STA method is not available. Please use 'correlation' or 'average'")
 
@@ -110,27 +118,33 @@ def sta(lfps, spiketrains, window, method="correlation", crosstrials=False, sing
 
 
 
-def sta_corr(lfps, spiketrains, window, crosstrials=False, single_data=None):
+def sta_corr(lfps, spiketrains, window, crosstrials=False, single_data=None, n_jobs=1):
     """
     Calculates the respective spike-triggered average of a analog signals of multiple trials
-    by binning the spiketrain and correlation of lfp and respective spiketrain.
+    by binning the spiketrain and correlation of lfp and respective spiketrain. The correlation
+    is only computed for the lags within the window, from the filled bins of the spiketrain.
 
     Calculates the spike triggered average of a AnalogSignal or AnalogSignalArray object in a
     time window +-window around the spike times in a SpikeTrain object.
 
     **Args**:
         lfps: AnalogSignal object or AnalogSignalArray object or list of AnalogSignals
+            An AnalogSignalArray (samples x channels) is taken as multiple channels of one
+            trial, for which the STAs of all channels are calculated at once
         spikes: SpikeTrain or list of SpikeTrains objects, its time intervall needs to
             be completely covered by the lfp
         window: positive time interval to specify the cutout around spikes given as Quantity or
             number of bins to use
         crosstrail: indicates if STA is averaged over all provided trials or calculated trial-wise
+        n_jobs: number of threads among which the trials are distributed (-1 for all CPUs).
+            Default value 1
 
     **Return**:
         Returns a tuple (STA,time,used_spikes), where STA is a list of one-dimensional arrays with
         the spike triggered average, and time is a list of the corresponding time bins.
         The length of the respective array is defined by 2*window + 1, where window is
-        the number of bins around the spike times used.
+        the number of bins around the spike times used. For multiple channels, the STA is a
+        two-dimensional array (channels x bins).
         used_spikes contains the number of spikes used for the STA. If the spiketrain did
         not contain suitable spikes, the returned STA will be filled with zeros.
 
@@ -143,68 +157,19 @@ def sta_corr(lfps, spiketrains, window, crosstrials=False, single_data=None):
     (lfps, spiketrains, window_times, wrapped, num_trials, window_bins, st_lfp_offsetbins, spiketrainbins) = data_quality_check(lfps, spiketrains, window, crosstrials, single_data)
 
 
-    # create binned spiketrains of spikes in suitable time window
-    st_binned = []
-    for trial in np.arange(num_trials):
-        # binning spiketrain with respect to its starting time
-        st_binned.append(np.zeros(spiketrainbins[trial], dtype=int))
-        for t in spiketrains[trial]:
-            # calculating spikebin from spiketime (respective to spiketrainstart)
-            spikebin = int(np.round(float(t - spiketrains[trial].t_start) / (spiketrains[trial].t_stop - spiketrains[trial].t_start) * spiketrainbins[trial]))
-             # checking if lfp signal around spiketime t is available
-            if spikebin + st_lfp_offsetbins[trial] > window_bins[trial] and len(lfps[trial]) - (st_lfp_offsetbins[trial] + spikebin) > window_bins[trial]:
-                # adds 1 to the bin corresponding to spiketime t
-                st_binned[trial][spikebin] += 1
-
-
-
-
-    # use the correlation function to calculate the STA
-    result_sta = []
-    result_time = []
-    used_spikes = []
-    for trial in np.arange(num_trials):
-
-        if all(np.equal(st_binned[trial] , 0)):  # This is slow!
-            print "No suitable spikes in trial detected. Reduce window size or supply more LFP data."
-            output = np.zeros(2 * window_bins[trial] + 1) * lfps[trial].units
-            result_sta.append(output)
-            # used_spikes.append(0)
-        else:
-            # cutting correct segment of lfp with respect to additional information outside of spiketrain intervall
-            lfp_start = st_lfp_offsetbins[trial] - window_bins[trial]
-            pre = []
-            post = []
-            if lfp_start < 0:
-                pre = np.zeros(-lfp_start)
-                lfp_start = 0
-            lfp_stop = st_lfp_offsetbins[trial] + spiketrainbins[trial] + window_bins[trial]
-            if lfp_stop > len(lfps[trial]):
-                post = np.zeros(lfp_stop - len(lfps[trial]))
-                lfp_stop = len(lfps[trial])
-
-            # appending pre and post for symetrie reasons of correlation
-            lfp = lfps[trial][lfp_start:lfp_stop]
-            if pre != []:
-                lfp = np.append(pre, lfp)
-            if post != []:
-                lfp = np.append(lfp, post)
-
-            # actual calculation of correlation and therefore STA of both signals
-            output = scipy.signal.correlate(lfp, st_binned[trial], mode='same') / np.sum(st_binned[trial]) * lfps[trial].units
-
-            bin_start = int(len(output) / 2) - window_bins[trial]
-            bin_end = int(len(output) / 2) + window_bins[trial]
-
-            # one additional bin to cut STA symmetrically around time = 0
-            result_sta.append(output[bin_start: bin_end + 1])
-
-        result_time.append(np.arange(-window_times[trial], (window_times[trial] + 1 / lfps[trial].sampling_rate).rescale(window_times[trial].units), (1 / lfps[trial].sampling_rate).rescale(window_times[trial].units))[0: 2 * window_bins[trial] + 1] * window_times[trial].units)
-        used_spikes.append(int(np.sum(st_binned[trial])))
+    def trial_sum(trial):
+        # create sparse binned spiketrain of spikes in suitable time window: the lfp bins of the
+        # filled bins and their spike counts
+        spike_lfpbins = _spike_lfpbins(spiketrains[trial], spiketrainbins[trial], st_lfp_offsetbins[trial], window_bins[trial], len(lfps[trial]))
+        lfpbins, inverse = np.unique(spike_lfpbins, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(lfpbins))
+        # use the correlation of lfp and binned spiketrain to calculate the STA. Only the lags
+        # within the window are needed, so the correlation is computed by gathering the lfp
+        # around the filled bins (weighted by their spike counts) instead of over the whole trial.
+        # (channels x bins) in case of multiple channels
+        return _window_sum(lfps[trial], lfpbins, window_bins[trial], counts).T, int(np.sum(counts))
 
-    # Averaging over all trials in case of crosstrialing
-    if crosstrials:
-        result_sta[0] = averaging_STAs(result_sta, used_spikes)
+    (result_sta, result_time, used_spikes) = _reduce_trials(trial_sum, lfps, window_times, window_bins, crosstrials, n_jobs)[:3]
 
 
     # Returns array in case only single LFP and spiketrains was passed
@@ -216,7 +181,7 @@ def sta_corr(lfps, spiketrains, window, crosstrials=False, single_data=None):
 
 #-------------------------------------------------------------------------------
 
-def sta_average(lfps, spiketrains, window, crosstrials=False, single_data=None):
+def sta_average(lfps, spiketrains, window, crosstrials=False, single_data=None, return_windows=False, n_jobs=1):
     """
     Calculates the respective spike-triggered average of a analog signals of multiple trials
     by averaging the respective parts of the lfp signal.
@@ -227,18 +192,28 @@ def sta_average(lfps, spiketrains, window, crosstrials=False, single_data=None):
 
     **Args**:
         lfps: AnalogSignal object or AnalogSignalArray object
+            An AnalogSignalArray (samples x channels) is taken as multiple channels of one
+            trial, for which the STAs of all channels are calculated at once
         spikes: SpikeTrain or list of SpikeTrains objects
         window: positive time interval to specify the cutout around given as Quantity or
         number of bins to use
         crosstrail: indicates if STA is averaged with all given trial or calculated trial-wise
+        return_windows: if True, the lfp cutouts around the used spikes are returned as well,
+            e.g. to compute bootstrap confidence intervals of the STA. Default value 'False'
+        n_jobs: number of threads among which the trials are distributed (-1 for all CPUs).
+            Default value 1
 
     **Return**:
         Returns a tuple (STA,time,used_spikes), where STA is a list of one-dimensional arrays with
         the spike triggered average, and time is a list of the corresponding time bins.
         The length of the respective array is defined by 2*window + 1, where window is
-        the number of bins around the spike times used.
+        the number of bins around the spike times used. For multiple channels, the STA is a
+        two-dimensional array (channels x bins).
         used_spikes contains the number of spikes used for the STA. If the spiketrain did
         not contain suitable spikes, the returned STA will be filled with zeros.
+        If return_windows is True, the tuple (STA,time,used_spikes,windows) is returned, where
+        windows is a list of arrays (used spikes x bins, or used spikes x channels x bins) with the lfp cutouts
+        of each trial (one array of the cutouts of all trials in case of crosstrials).
 
     **Example**:
         (result,time,used_spikes)=sta_average([lfp1,lfp2], [spiketrain1,spiketrain2], Quantity(10,"ms"), crosstrials)
@@ -249,53 +224,35 @@ def sta_average(lfps, spiketrains, window, crosstrials=False, single_data=None):
     (lfps, spiketrains, window_times, wrapped, num_trials, window_bins, st_lfp_offsetbins, spiketrainbins) = data_quality_check(lfps, spiketrains, window, crosstrials, single_data)
 
 
-    # calculate the spike-triggered-average by averaging the respective intervals of the lfp
-    result_sta = []
-    result_time = []
-    used_spikes = np.zeros(num_trials, dtype=int)
-    for trial in range(num_trials):
+    def trial_sum(trial):
+        # lfp bins of all spikes with sufficient lfp data around them
+        lfp = np.asarray(lfps[trial])
+        spike_lfpbins = _spike_lfpbins(spiketrains[trial], spiketrainbins[trial], st_lfp_offsetbins[trial], window_bins[trial], len(lfp))
         # summing over all respective lfp intervals around spiketimes
-        lfp_sum = np.zeros(2 * window_bins[trial] + 1) * lfps[trial].units
-
-        for spiketime in spiketrains[trial]:
-            # converting spiketime to respective bin in binned spiketrain (which starts at t_start of spiketrain)
-            spikebin = int(np.round(float(spiketime - spiketrains[trial].t_start) / (spiketrains[trial].t_stop - spiketrains[trial].t_start) * spiketrainbins[trial]))
-
-           # checks for sufficient lfp data around spikebin
-            if spikebin + st_lfp_offsetbins[trial] > window_bins[trial]  and len(lfps[trial]) - (spikebin + st_lfp_offsetbins[trial]) > window_bins[trial]:
-
-                # determines lfp interval to cut with respect to spiketrain timing
-                bin_start = spikebin - window_bins[trial]
-                bin_end = spikebin + window_bins[trial] + 1
-                # actual copying of lfp interval
-                lfp_cutout = lfps[trial][st_lfp_offsetbins[trial] + bin_start:st_lfp_offsetbins[trial] + bin_end]
-
-                # conversion of lfp AnalogSignal to quantity numpy array and summing up
-                # TODO: This step is slow due to copying the whole array -> Faster version?
-                lfp_sum = lfp_sum + np.array(lfp_cutout) * lfp_cutout.units
-
-                used_spikes[trial] += 1
-
-        if used_spikes[trial] == 0:
-            print "No suitable spikes in trial detected. Reduce window size or supply more LFP data."
-            result_sta.append(lfp_sum)
-        else:
-            # normalizing STA
-            result_sta.append(lfp_sum / used_spikes[trial])
-        # generating timesteps for STA
-        result_time.append(np.arange(-window_times[trial], (window_times[trial] + 1 / lfps[trial].sampling_rate).rescale(window_times[trial].units), (1 / lfps[trial].sampling_rate).rescale(window_times[trial].units))[0:len(result_sta[trial])] * window_times[trial].units)
-
+        # (channels x bins) in case of multiple channels
+        lfp_sum = _window_sum(lfp, spike_lfpbins, window_bins[trial]).T
+        if not return_windows:
+            return lfp_sum, len(spike_lfpbins)
+        windows = _spike_windows(lfp, window_bins[trial])[spike_lfpbins - window_bins[trial]]
+        if windows.ndim == 3:
+            windows = windows.transpose(0, 2, 1)
+        return lfp_sum, len(spike_lfpbins), windows
 
-    # Averaging over all trials in case of crosstrialing
-    if crosstrials:
-        result_sta[0] = averaging_STAs(result_sta, used_spikes)
+    # calculate the spike-triggered-average by averaging the respective intervals of the lfp
+    (result_sta, result_time, used_spikes, result_windows) = _reduce_trials(trial_sum, lfps, window_times, window_bins, crosstrials, n_jobs)
+    used_spikes = np.array(used_spikes, dtype=int)
 
 
     # Returns array in case only single LFP and spiketrains was passed or averaging over trials was done
     if wrapped or crosstrials:
-        return result_sta[0], result_time[0], used_spikes[0]
+        result = result_sta[0], result_time[0], used_spikes[0]
+        if return_windows:
+            result += (result_windows[0],)
     else:
-        return result_sta, result_time, used_spikes
+        result = result_sta, result_time, used_spikes
+        if return_windows:
+            result += (result_windows,)
+    return result
 
 
 
@@ -336,8 +293,8 @@ def data_quality_check(lfps, spiketrains, window, crosstrials, single_data):
         raise ValueError("Argument 'window' must be positive.")
 
     wrapped = False
-    # wrapping lfps
-    if type(lfps) != list and lfps.ndim == 1:
+    # wrapping lfps (two-dimensional lfps contain multiple channels of a single trial)
+    if type(lfps) != list and lfps.ndim in (1, 2):
         box = []
         box.append(lfps)
         lfps = box
@@ -362,42 +319,48 @@ def data_quality_check(lfps, spiketrains, window, crosstrials, single_data):
         raise ValueError("Number of LFPs and spiketrains has to be the same")
 
 
-    # Checking trial-wise for matching times of lfp and spiketrain
+    # Checking trial-wise for matching times of lfp and spiketrain. The unit conversions are
+    # calculated once for each combination of units (see _conversion_factor) instead of
+    # rescaling quantities in each trial, which is slow for thousands of trials.
     num_trials = len(lfps)
     st_lfp_offsetbins = np.zeros(num_trials, dtype=int)
     spiketrainbins = np.zeros(num_trials, dtype=int)
+    factors = {}
 
     for trial in range(num_trials):
-       # bin distance between start of lfp and spiketrain signal
-        st_lfp_offsetbins[trial] = int (((spiketrains[trial].t_start - lfps[trial].t_start) * lfps[trial].sampling_rate).rescale('dimensionless'))
-        spiketrainbins[trial] = int (((spiketrains[trial].t_stop - spiketrains[trial].t_start) * lfps[trial].sampling_rate).rescale('dimensionless'))
+        t_start = spiketrains[trial].t_start
+        t_stop = spiketrains[trial].t_stop
+        lfp_t_start = lfps[trial].t_start
+        sampling_rate = lfps[trial].sampling_rate
+        # bin distance between start of lfp and spiketrain signal
+        st_lfp_offsetbins[trial] = int((t_start.magnitude - lfp_t_start.magnitude * _conversion_factor(lfp_t_start, t_start, factors)) * sampling_rate.magnitude * _conversion_factor(t_start, sampling_rate, factors, product=True))
+        spiketrainbins[trial] = int((t_stop.magnitude - t_start.magnitude * _conversion_factor(t_start, t_stop, factors)) * sampling_rate.magnitude * _conversion_factor(t_stop, sampling_rate, factors, product=True))
 
         # checking time length in bins of lfps and spiketrains
         if len(lfps[trial]) < spiketrainbins[trial]:
-            raise ValueError("LFP signal covers less bins than spiketrain. (LFP length: %i bins, spiketrain: %i bins)" % (len(lfps[trial]), len(spiketrainbins[trial])))
+            raise ValueError("LFP signal covers less bins than spiketrain. (LFP length: %i bins, spiketrain: %i bins)" % (len(lfps[trial]), spiketrainbins[trial]))
         if st_lfp_offsetbins[trial] < 0  or len(lfps[trial]) < st_lfp_offsetbins[trial] + spiketrainbins[trial]:
             raise ValueError("LFP does not cover the whole time of the spiketrain")
 
 
     # checking if STA across trials is possible to calculate due to sampling rates
-    if crosstrials == True and any(lfp.sampling_rate != lfps[0].sampling_rate for lfp in lfps):
-        print "Warning: Trials to cross do not have the same sampling rate"
+    if crosstrials == True and any(lfp.sampling_rate.magnitude * _conversion_factor(lfp.sampling_rate, lfps[0].sampling_rate, factors) != lfps[0].sampling_rate.magnitude for lfp in lfps):
+        print("Warning: Trials to cross do not have the same sampling rate")
         raise ValueError("For calculating STA of multiple trials all need the same sampling rate")
 
 
     # determine correct window size for each trial and calculating the missing variable window_bins or window_times
-    window_times = np.zeros(num_trials) * pq.s
     window_bins = []
     if type(window) == pq.quantity.Quantity:
-        # for loop is necessary in the following lines, otherwise units will be disregarded
+        window_time = window.rescale(pq.s)
+        window_times = np.ones(num_trials) * window_time
         for trial in range(num_trials):
-            window_times[trial] = window
-            window_bins.append(int((window_times[trial] * lfps[trial].sampling_rate).rescale("dimensionless")))
+            window_bins.append(int(window_time.magnitude * lfps[trial].sampling_rate.magnitude * _conversion_factor(window_time, lfps[trial].sampling_rate, factors, product=True)))
     # check if windowsize gives number of bins which has to be converted into time interval
     elif type(window) == int:
-        for trial in np.arange(num_trials):
-            window_times[trial] = window / lfps[trial].sampling_rate
-            window_bins.append(window)
+        sampling_periods = [1 / _conversion_factor(lfp.sampling_rate, 1 / pq.s, factors) / lfp.sampling_rate.magnitude for lfp in lfps]
+        window_times = window * np.array(sampling_periods) * pq.s
+        window_bins = [window] * num_trials
     else:
         raise ValueError("window needs to be either a time quantity or an integer")
 
@@ -422,9 +385,190 @@ def averaging_STAs(stas, used_spikes):
     """
 
 
-    cross_sta = np.zeros(len(stas[0]))
+    cross_sta = np.zeros(np.shape(stas[0]))
     for trial in np.arange(len(stas)):
         cross_sta[:] += stas[trial] * used_spikes[trial]
     if np.sum(used_spikes) != 0:
         return cross_sta / np.sum(used_spikes)
     else: return cross_sta
+
+
+#-------------------------------
+
+def memmap_lfp(data, sampling_rate, t_start=0 * pq.s, units=pq.dimensionless):
+    """
+    Supplementary function
+    Wraps a numpy.memmap of lfp samples (e.g. of a large raw binary file) into an AnalogSignal
+    (one-dimensional data) or AnalogSignalArray (two-dimensional data, samples x channels)
+    without loading or copying the data. The STA functions only read the samples in the
+    windows around the spikes, so that only the respective pages of the file are loaded.
+
+    **Args**:
+        data: numpy.memmap (or any other array) with the lfp samples
+        sampling_rate: sampling rate of the lfp given as Quantity
+        t_start: time of the first sample given as Quantity. Default value 0 s
+        units: units of the lfp samples. Default value dimensionless
+
+    **Return**:
+        Returns an AnalogSignal or AnalogSignalArray sharing the memory of data
+
+    **Example**:
+        data = numpy.memmap('lfp.dat', dtype='int16', mode='r').reshape(-1, 96)
+        lfp = memmap_lfp(data, Quantity(30, "kHz"), units='uV')
+        (result,time,used_spikes)=sta_average(lfp,spiketrain,Quantity(10,"ms"))
+    """
+    if np.ndim(data) == 1:
+        return AnalogSignal(data, units=units, sampling_rate=sampling_rate, t_start=t_start, copy=False)
+    elif np.ndim(data) == 2:
+        return AnalogSignalArray(data, units=units, sampling_rate=sampling_rate, t_start=t_start, copy=False)
+    else:
+        raise ValueError("lfp data needs to be one- or two-dimensional, not %i-dimensional" % np.ndim(data))
+
+
+#-------------------------------
+
+def _conversion_factor(from_quantity, to_quantity, factors, product=False):
+    """
+    Supplementary function
+    Returns the factor converting magnitudes in the units of from_quantity into the units of
+    to_quantity or, if product is True, the product of magnitudes in the units of both
+    quantities into a dimensionless number. The factors are cached in the dictionary factors
+    for each combination of units.
+    """
+    key = (from_quantity.dimensionality.string, to_quantity.dimensionality.string, product)
+    if key not in factors:
+        if product:
+            unit = pq.Quantity(1.0, from_quantity.units) * pq.Quantity(1.0, to_quantity.units)
+            factors[key] = float(unit.rescale(pq.dimensionless).magnitude)
+        else:
+            factors[key] = float(pq.Quantity(1.0, from_quantity.units).rescale(to_quantity.units).magnitude)
+    return factors[key]
+
+
+#-------------------------------
+
+def _reduce_trials(trial_sum, lfps, window_times, window_bins, crosstrials, n_jobs):
+    """
+    Supplementary function
+    Calculates trial_sum(trial) for all trials, which returns the sum of the lfp cutouts around
+    the used spikes of the trial, the number of used spikes and optionally the cutouts, and
+    reduces the results to the STA of each trial, or to the cross-trial STA in case of
+    crosstrials. The cross-trial STA is accumulated online (weighting each trial by its number
+    of used spikes, as averaging_STAs), so that the STAs of the single trials are not kept.
+
+    **Return**:
+        Returns a tuple (result_sta, result_time, used_spikes, result_windows) of lists
+        (containing only the cross-trial STA and time in case of crosstrials)
+    """
+    result_sta = []
+    result_time = []
+    used_spikes = []
+    result_windows = []
+    cross_sum = None
+    for trial, result in enumerate(_map_trials(trial_sum, len(lfps), n_jobs)):
+        lfp_sum, num_spikes = result[:2]
+        used_spikes.append(num_spikes)
+        if len(result) > 2:
+            result_windows.append(result[2])
+        if num_spikes == 0:
+            print("No suitable spikes in trial detected. Reduce window size or supply more LFP data.")
+
+        if crosstrials:
+            cross_sum = lfp_sum if cross_sum is None else cross_sum + lfp_sum
+        else:
+            # normalizing STA
+            result_sta.append(lfp_sum / max(num_spikes, 1) * lfps[trial].units)
+        # generating timesteps for STA
+        if not crosstrials or trial == 0:
+            result_time.append(np.arange(-window_times[trial], (window_times[trial] + 1 / lfps[trial].sampling_rate).rescale(window_times[trial].units), (1 / lfps[trial].sampling_rate).rescale(window_times[trial].units))[0: 2 * window_bins[trial] + 1] * window_times[trial].units)
+
+    # Averaging over all trials in case of crosstrialing
+    if crosstrials:
+        result_sta = [cross_sum / max(np.sum(used_spikes), 1)]
+        if result_windows:
+            result_windows = [np.concatenate(result_windows) * lfps[0].units]
+    else:
+        result_windows = [windows * lfp.units for windows, lfp in zip(result_windows, lfps)]
+    return result_sta, result_time, used_spikes, result_windows
+
+
+def _map_trials(func, num_trials, n_jobs):
+    """
+    Supplementary function
+    Yields func(trial) for all trials in order. If n_jobs > 1 (or -1 for all CPUs), the trials
+    are calculated in a pool of n_jobs threads, which run in parallel as numpy releases the
+    GIL while gathering and summing the lfp cutouts.
+    """
+    if n_jobs == -1:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs < 1:
+        raise ValueError("n_jobs (%s) must be -1 or a positive integer" % str(n_jobs))
+    if n_jobs == 1 or num_trials < 2:
+        for trial in range(num_trials):
+            yield func(trial)
+        return
+    pool = ThreadPool(min(n_jobs, num_trials))
+    try:
+        for result in pool.imap(func, range(num_trials)):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+#-------------------------------
+
+def _spike_lfpbins(spiketrain, spiketrainbins, st_lfp_offsetbins, window_bins, lfp_len):
+    """
+    Supplementary function
+    Returns the lfp bins of the spikes of spiketrain which have at least window_bins bins
+    of lfp data on both sides (excluding the first possible bin, as in the original
+    per-spike implementation).
+    """
+    # converting spiketimes to respective bins in binned spiketrain (which starts at t_start
+    # of spiketrain), all spikes at once
+    t_start = spiketrain.t_start.rescale(spiketrain.units).magnitude
+    duration = (spiketrain.t_stop - spiketrain.t_start).rescale(spiketrain.units).magnitude
+    spikebins = np.round((spiketrain.magnitude - t_start) / duration * spiketrainbins).astype(int)
+    lfpbins = spikebins + st_lfp_offsetbins
+    # checks for sufficient lfp data around spikebins
+    return lfpbins[(lfpbins > window_bins) & (lfp_len - lfpbins > window_bins)]
+
+
+def _spike_windows(signal, window_bins):
+    """
+    Supplementary function
+    Returns a read-only strided view of signal (samples first) with the cutouts of 2*window_bins+1
+    samples starting at each sample, i.e. the cutout around bin i is at index i - window_bins.
+    """
+    signal = np.asarray(signal)
+    num_windows = max(signal.shape[0] - 2 * window_bins, 0)
+    windows = as_strided(signal, shape=(num_windows, 2 * window_bins + 1) + signal.shape[1:],
+                         strides=(signal.strides[0],) + signal.strides)
+    windows.flags.writeable = False
+    return windows
+
+
+def _window_sum(signal, lfpbins, window_bins, weights=None):
+    """
+    Supplementary function
+    Sum of the cutouts of signal around the bins lfpbins (array of 2*window_bins+1 bins,
+    followed by the channel axis in case of a two-dimensional signal), optionally weighted by
+    weights. The cutouts are gathered from strided views of the cutouts in blocks of channels
+    and chunks of bins to bound the memory used.
+    """
+    signal = np.asarray(signal)
+    signal_2d = signal.reshape(len(signal), -1)
+    window_len = 2 * window_bins + 1
+    window_sum = np.zeros((window_len, signal_2d.shape[1]))
+    channel_block = max(1, 2 ** 14 // window_len)
+    for c_start in range(0, signal_2d.shape[1], channel_block):
+        windows = _spike_windows(signal_2d[:, c_start:c_start + channel_block], window_bins)
+        chunk = max(1, 2 ** 20 // int(np.prod(windows.shape[1:])))
+        for start in range(0, len(lfpbins), chunk):
+            cutouts = windows[lfpbins[start:start + chunk] - window_bins]
+            if weights is None:
+                window_sum[:, c_start:c_start + channel_block] += cutouts.sum(axis=0, dtype=float)
+            else:
+                window_sum[:, c_start:c_start + channel_block] += np.tensordot(weights[start:start + chunk].astype(float), cutouts, axes=1)
+    return window_sum.reshape((window_len,) + signal.shape[1:])
@@ -6,6 +6,138 @@ import quantities as pq
 import elephant.rep as rep
 
 
+class spike_index(object):
+    """
+    Index of the spikes of a list of spike trains, built once to be queried
+    repeatedly by fanofactor(), cv(), peth(), complexity() and
+    complexity_histogram() (e.g. with different bin sizes or time ranges),
+    which accept it in place of the list of spike trains.
+
+    The spike times of all trains are kept sorted across trains, together
+    with the index of the train of each spike, so that the spikes in a time
+    range are found by binary search instead of slicing and binning every
+    SpikeTrain for each query. Spike trains with different units are kept
+    apart (usually there is a single unit), so that the times are compared
+    and binned in the units of their spike trains exactly as for the list
+    of spike trains.
+
+    Parameters
+    ----------
+    spiketrains : list of neo.SpikeTrain
+        the spike trains to index
+
+    Attributes
+    ----------
+    t_starts, t_stops : list of Quantity
+        t_start and t_stop of each spike train
+    t_start, t_stop : Quantity
+        the maximum t_start and the minimum t_stop of the spike trains
+
+    Example
+    -------
+    >>> index = spike_index(sts)
+    >>> for w in [1, 2, 5, 10] * pq.ms:
+    ...     hist = peth(index, w)
+    """
+
+    def __init__(self, spiketrains):
+        if isinstance(spiketrains, neo.core.SpikeTrain):
+            spiketrains = [spiketrains]
+        if len(spiketrains) == 0:
+            raise ValueError('spiketrains must not be empty')
+        self.t_starts = [st.t_start for st in spiketrains]
+        self.t_stops = [st.t_stop for st in spiketrains]
+        # Internal range where all spike trains are defined
+        self.t_start = max(self.t_starts)
+        self.t_stop = min(self.t_stops)
+        self._same_range = (
+            all([self.t_start == t for t in self.t_starts]),
+            all([self.t_stop == t for t in self.t_stops]))
+
+        # Sorted spike times and train indices for each distinct unit
+        trains_by_unit = {}
+        for i, st in enumerate(spiketrains):
+            trains_by_unit.setdefault(rep._unit_key(st), []).append(i)
+        self._groups = []
+        for trains in trains_by_unit.values():
+            units = spiketrains[trains[0]].units
+            times = numpy.concatenate(
+                [spiketrains[i].magnitude.ravel() for i in trains])
+            ids = numpy.repeat(
+                trains, [len(spiketrains[i]) for i in trains])
+            order = numpy.argsort(times, kind='mergesort')
+            self._groups.append((units, times[order], ids[order]))
+
+        # Spike times in seconds, train after train, for the ISIs
+        self._times, self._offsets = _pooled_times(spiketrains)
+        self._isis = None
+
+    def __len__(self):
+        return len(self.t_starts)
+
+    def _spikes(self, t_start=None, t_stop=None):
+        # For each unit, the spike times (dimensionless, in that unit) and
+        # train indices of the spikes between t_start and t_stop (both
+        # included), as selected by SpikeTrain.time_slice()
+        for units, times, ids in self._groups:
+            start = 0 if t_start is None else times.searchsorted(
+                float(t_start.rescale(units).magnitude), side='left')
+            stop = len(times) if t_stop is None else times.searchsorted(
+                float(t_stop.rescale(units).magnitude), side='right')
+            yield units, times[start:stop], ids[start:stop]
+
+    def spike_counts(self, t_start=None, t_stop=None):
+        """
+        Returns the number of spikes of each spike train between t_start and
+        t_stop (both included, all spikes if None).
+        """
+        counts = numpy.zeros(len(self), dtype=int)
+        for units, times, ids in self._spikes(t_start, t_stop):
+            counts += numpy.bincount(ids, minlength=len(self))
+        return counts
+
+    def bin_counts(self, binsize, t_start, t_stop, clip=False):
+        """
+        Returns the number of spikes of all spike trains between t_start and
+        t_stop (both included) in each bin of width binsize from t_start,
+        binned as by rep.binned_st(), and optionally clipped to one spike
+        per spike train and bin.
+        """
+        bins, ids, num_bins = self.bin_indices(binsize, t_start, t_stop)
+        if clip:
+            bins = numpy.unique(ids * num_bins + bins) % num_bins
+        return numpy.bincount(bins, minlength=num_bins)
+
+    def bin_indices(self, binsize, t_start, t_stop):
+        """
+        Returns the bin index and the spike train index of each spike between
+        t_start and t_stop (both included) in the bins of width binsize from
+        t_start, binned as by rep.binned_st(), and the number of bins.
+        """
+        num_bins = rep.calc_num_bins(binsize, t_start, t_stop)
+        all_bins, all_ids = [], []
+        for units, times, ids in self._spikes(t_start, t_stop):
+            offset = float(t_start.rescale(units).magnitude)
+            factor = float(units.rescale(binsize.units).magnitude)
+            bins = (times - offset) * factor / float(binsize.magnitude)
+            in_range = bins >= 0
+            bins, ids = bins[in_range].astype(int), ids[in_range]
+            in_range = bins < num_bins
+            all_bins.append(bins[in_range])
+            all_ids.append(ids[in_range])
+        return (numpy.concatenate(all_bins), numpy.concatenate(all_ids),
+                num_bins)
+
+    def isis(self):
+        """
+        Returns the ISIs of all spike trains (dimensionless, meant in
+        seconds), train after train, as collected by cv().
+        """
+        if self._isis is None:
+            self._isis = _isis_from_pooled(self._times, self._offsets)
+        return self._isis
+
+
 def fanofactor(spiketrains):
     """
     Evaluates the empirical Fano factor F of the spike counts of a list of
@@ -23,7 +155,7 @@ def fanofactor(spiketrains):
 
     Parameters
     ----------
-    spiketrains : list of neo.core.SpikeTrain objects
+    spiketrains : list of neo.core.SpikeTrain objects, or spike_index
         Spike trains for which to compute the F of spike counts.
 
     Returns
@@ -39,10 +171,13 @@ def fanofactor(spiketrains):
     in such a situation.
     """
     # Build array of spike counts (one per spike train)
-    spike_counts = numpy.array([len(t) for t in spiketrains])
+    if isinstance(spiketrains, spike_index):
+        spike_counts = spiketrains.spike_counts()
+    else:
+        spike_counts = numpy.array([len(t) for t in spiketrains])
 
     # Compute fano factor
-    if all([count == 0 for count in spike_counts]):
+    if not spike_counts.any():
         fano = 0.
     else:
         fano = spike_counts.var() / spike_counts.mean()
@@ -98,14 +233,35 @@ def ff_timeresolved(x, win=None, start=None, stop=None, step=None):
 
     """
 
+    windows = _sliding_windows(x, win, start, stop, step, 'FF')
+    windows = windows.rescale(x[0].units)
+
+    # Compute the FF of the spike counts in each window defined above
+    counts = _window_counts(x, windows)
+    ff_values = numpy.zeros(len(windows))
+    filled = counts.any(axis=1)
+    if filled.any():
+        counts = counts[filled].astype(float)
+        ff_values[filled] = counts.var(axis=1) / counts.mean(axis=1)
+
+    return ff_values, windows
+
+
+def _sliding_windows(spiketrains, win, start, stop, step, measure):
+    """
+    Supplementary function of ff_timeresolved() and cv_timeresolved():
+    returns the (n, 2) Quantity array (in seconds) of the sliding windows
+    of length win and shift step between start and stop, which default to
+    the range of the spike trains.
+    """
     # Compute max(t_start) and min(t_stop) and check consistency
-    max_tstart = min([t.t_start for t in x])
-    min_tstop = max([t.t_stop for t in x])
+    max_tstart = min([t.t_start for t in spiketrains])
+    min_tstop = max([t.t_stop for t in spiketrains])
 
-    if not (all([max_tstart == t.t_start for t in x]) and
-                all([min_tstop == t.t_stop for t in x])):
-        warnings.warning('spike trains have different t_start or t_stop'
-                         ' values. FF computed for inner values only')
+    if not (all([max_tstart == t.t_start for t in spiketrains]) and
+                all([min_tstop == t.t_stop for t in spiketrains])):
+        warnings.warn('spike trains have different t_start or t_stop'
+                      ' values. %s computed for inner values only' % measure)
 
     # Set start, stop, window length and step for the default cases
     t_start = max_tstart if start is None else start
@@ -119,27 +275,54 @@ def ff_timeresolved(x, win=None, start=None, stop=None, step=None):
     wlen_dl = float(wlen.simplified.base)
     step_dl = float(wstep.simplified.base)
 
-    # Define the centers of the sliding windows where the FF must be computed
-    ff_times = numpy.arange(wlen_dl / 2. + start_dl,
-                            stop_dl - wlen_dl / 2. + step_dl / 2, step_dl)
+    # Define the centers of the sliding windows
+    times = numpy.arange(wlen_dl / 2. + start_dl,
+                         stop_dl - wlen_dl / 2. + step_dl / 2, step_dl)
 
-    # Define the windows within which the FF must be computed (as Nx2 array)
-    windows = pq.s * numpy.array([numpy.max([ff_times - wlen_dl / 2.,
+    # Define the windows as Nx2 array
+    windows = pq.s * numpy.array([numpy.max([times - wlen_dl / 2.,
                                              start_dl * numpy.ones(
-                                                 len(ff_times))], axis=0),
-                                  numpy.min([ff_times
-                                             + wlen_dl / 2.,
+                                                 len(times))], axis=0),
+                                  numpy.min([times + wlen_dl / 2.,
                                              stop_dl * numpy.ones(
-                                                 len(ff_times))], axis=0)]).T
-    windows = windows.rescale(x[0].units)
+                                                 len(times))], axis=0)]).T
+    return windows
 
-    # Compute the FF in each window define above
-    ff_values = numpy.zeros(len(ff_times))
-    for i, w in enumerate(windows):
-        x_sliced = [t.time_slice(w[0], w[1]) for t in x]
-        ff_values[i] = fanofactor(x_sliced)
 
-    return ff_values, windows
+def _window_counts(spiketrains, windows):
+    """
+    Supplementary function of ff_timeresolved(): returns the
+    (windows x spike trains) array of the number of spikes of each spike
+    train in each window, bounds included as in SpikeTrain.time_slice().
+    """
+    counts = numpy.zeros((len(windows), len(spiketrains)), dtype=int)
+    for j, (first, stop) in enumerate(_window_spikes(spiketrains, windows)):
+        counts[:, j] = stop - first
+    return counts
+
+
+def _window_spikes(spiketrains, windows):
+    """
+    Supplementary function of ff_timeresolved() and cv_timeresolved(): for
+    each spike train, yields the index of the first spike in each window
+    and of the first spike after it (so that both are equal for windows
+    without spikes), counting the spikes in the order of their times. The
+    window bounds are included as in SpikeTrain.time_slice().
+
+    The spike times of each train are sorted once, and the spikes of all
+    windows are found by binary search, so that the cost does not depend on
+    the overlap of the windows.
+    """
+    bounds = {}
+    for st in spiketrains:
+        # windows in the units of the spike train, as compared by time_slice
+        key = st.dimensionality.string
+        if key not in bounds:
+            bounds[key] = windows.rescale(st.units).magnitude
+        times = numpy.sort(st.magnitude)
+        first = times.searchsorted(bounds[key][:, 0], side='left')
+        stop = times.searchsorted(bounds[key][:, 1], side='right')
+        yield first, numpy.maximum(stop, first)
 
 
 def isi_pdf(spiketrain, bins=10, rng=None, density=False):
@@ -187,23 +370,21 @@ def isi_pdf(spiketrain, bins=10, rng=None, density=False):
 
     # Collect all ISIs from all SpikeTrains in spiketrain
     # (as dimensionless array, meant in seconds)
-    isis = []
-    for st in spiketrain:
-        isis = numpy.hstack([isis, numpy.diff(st.simplified.magnitude)])
+    isis = _pooled_isis(spiketrain)
 
     # Set histogram rng [isi_min, isi_max]
     if rng is None:
-        isi_min, isi_max = min(isis), max(isis)
+        isi_min, isi_max = isis.min(), isis.max()
     elif len(rng) == 2:
         if rng[0] is None:
-            isi_min = min(isis)
+            isi_min = isis.min()
         else:
             try:
                 isi_min = rng[0].rescale('s').magnitude
             except:
                 raise ValueError('rng[0] must be a time Quantity')
         if rng[1] is None:
-            isi_max = max(isis)
+            isi_max = isis.max()
         else:
             try:
                 isi_max = rng[1].rescale('s').magnitude
@@ -241,6 +422,54 @@ def isi_pdf(spiketrain, bins=10, rng=None, density=False):
     return neo.AnalogSignal(signal=vals, sampling_period=w, t_start=edges[0])
 
 
+def _pooled_isis(spiketrains):
+    """
+    Supplementary function of isi_pdf(), cv() and ISIpdf(): returns the ISIs
+    of all spike trains in one array (dimensionless, meant in seconds),
+    train after train.
+    """
+    times, offsets = _pooled_times(spiketrains)
+    return _isis_from_pooled(times, offsets)
+
+
+def _pooled_times(spiketrains):
+    """
+    Supplementary function of _pooled_isis() and spike_index: returns the
+    spike times of all spike trains in one preallocated array (dimensionless,
+    meant in seconds), train after train, and the offsets of the trains in
+    it (the spikes of the i-th train are times[offsets[i]:offsets[i + 1]]).
+    """
+    lengths = [len(st) for st in spiketrains]
+    offsets = numpy.concatenate([[0], numpy.cumsum(lengths)]).astype(int)
+    times = numpy.empty(offsets[-1])
+    factors = {}
+    for st, start, stop in zip(spiketrains, offsets[:-1], offsets[1:]):
+        key = st.dimensionality.string
+        if key not in factors:
+            factors[key] = float(pq.Quantity(1., st.units).simplified)
+        times[start:stop] = st.magnitude
+        if factors[key] != 1.:
+            times[start:stop] *= factors[key]
+    return times, offsets
+
+
+def _isis_from_pooled(times, offsets):
+    """
+    Supplementary function of _pooled_isis() and spike_index: returns the
+    ISIs of the spike trains pooled by _pooled_times(), computing the
+    differences of all spike times at once and dropping those between the
+    last spike of a train and the first spike of the next one.
+    """
+    isis = numpy.diff(times)
+    # the difference isis[i - 1] crosses the boundary at the start i of a
+    # spike train (other than the first)
+    boundaries = offsets[1:-1]
+    boundaries = boundaries[(boundaries > 0) & (boundaries < len(times))]
+    keep = numpy.ones(len(isis), dtype=bool)
+    keep[boundaries - 1] = False
+    return isis[keep]
+
+
 def isi(spiketrain, axis=-1):
     """
     This ISI function is a adjusted port from the elephant repository and will
@@ -292,9 +521,9 @@ def cv(spiketrains):
 
     Parameters
     ---------
-    spiketrains: SpikeTrain or list of SpikeTrains
-        A `neo.SpikeTrain` object or a list of `neo.core.SpikeTrain` objects,
-        for which to compute the CV.
+    spiketrains: SpikeTrain or list of SpikeTrains, or spike_index
+        A `neo.SpikeTrain` object or a list of `neo.core.SpikeTrain` objects
+        (or a spike_index of them), for which to compute the CV.
 
     Returns
     -------
@@ -308,10 +537,10 @@ def cv(spiketrains):
         spiketrains = [spiketrains]
 
     # Collect the ISIs of all trains in spiketrains, and return their CV
-    isis = numpy.array([])
-    for st in spiketrains:
-        if len(st) > 1:
-            isis = numpy.hstack([isis, numpy.diff(st.simplified.base)])
+    if isinstance(spiketrains, spike_index):
+        isis = spiketrains.isis()
+    else:
+        isis = _pooled_isis(spiketrains)
 
     # Compute CV of ISIs
     if len(isis) == 0:
@@ -373,43 +602,55 @@ def cv_timeresolved(spiketrain, win=None, start=None, stop=None, step=None):
     if type(spiketrain) == neo.core.SpikeTrain:
         spiketrain = [spiketrain]
 
-    max_tstart = min([t.t_start for t in spiketrain])
-    min_tstop = max([t.t_stop for t in spiketrain])
-
-    if not (all([max_tstart == t.t_start for t in spiketrain]) and
-                all([min_tstop == t.t_stop for t in spiketrain])):
-        warnings.warning('spike trains have different t_start or t_stop'
-                         ' values. CV computed for inner values only')
-
-    t_start = max_tstart if start is None else start
-    t_stop = min_tstop if stop is None else stop
-    wlen = t_stop - t_start if win is None else win
-    wstep = wlen if step is None else step
-
-    # Convert all time quantities in dimensionless (_dl) units (meant in s)
-    start_dl = float(t_start.simplified.base)
-    stop_dl = float(t_stop.simplified.base)
-    wlen_dl = float(wlen.simplified.base)
-    step_dl = float(wstep.simplified.base)
-
-    # Define the centers of the sliding windows where the CV must be computed
-    cv_times = numpy.arange(wlen_dl / 2. + start_dl,
-                            stop_dl - wlen_dl / 2. + step_dl / 2, step_dl)
-
-    # Define the nx2 array of time windows within which to compute the CV
-    windows = pq.s * numpy.array([numpy.max([cv_times - wlen_dl / 2.,
-                                             start_dl * numpy.ones(
-                                                 len(cv_times))], axis=0),
-                                  numpy.min([cv_times +
-                                             wlen_dl / 2.,
-                                             stop_dl * numpy.ones(
-                                                 len(cv_times))], axis=0)]).T
+    windows = _sliding_windows(spiketrain, win, start, stop, step, 'CV')
+
+    # ISIs of each spike train (as dimensionless array, meant in seconds),
+    # centered on their mean for the accuracy of the variances below
+    isis = [numpy.diff(numpy.sort(st.simplified.magnitude))
+            for st in spiketrain]
+    num_isis = sum([len(isi) for isi in isis])
+    shift = sum([isi.sum() for isi in isis]) / max(num_isis, 1)
+
+    # Number, sum and sum of squares of the ISIs in each window, from the
+    # cumulative sums of the ISIs of each spike train. The ISIs in a window
+    # are those between two spikes in the window.
+    counts = numpy.zeros(len(windows))
+    sums = numpy.zeros(len(windows))
+    squares = numpy.zeros(len(windows))
+    # upper bound of the rounding errors of the sums of squares
+    errors = numpy.zeros(len(windows))
+    ranges = []
+    for isi, (first, stop) in zip(isis, _window_spikes(spiketrain, windows)):
+        centered = isi - shift
+        cum_sums = numpy.concatenate([[0.], numpy.cumsum(centered)])
+        cum_squares = numpy.concatenate([[0.], numpy.cumsum(centered ** 2)])
+        last = numpy.minimum(numpy.maximum(stop - 1, first), len(isi))
+        first = numpy.minimum(first, len(isi))
+        counts += last - first
+        sums += cum_sums[last] - cum_sums[first]
+        squares += cum_squares[last] - cum_squares[first]
+        errors += cum_squares[last] + cum_squares[first]
+        ranges.append((first, last))
 
     # Compute the CV in each window defined above
-    cv_values = numpy.zeros(len(cv_times))  # Initialize CV values to 0
-    for i, w in enumerate(windows):
-        x_sliced = [t.time_slice(w[0], w[1]) for t in spiketrain]
-        cv_values[i] = cv(x_sliced)
+    cv_values = numpy.zeros(len(windows))  # Initialize CV values to 0
+    filled = counts > 0
+    means = sums[filled] / counts[filled]
+    deviations = squares[filled] - sums[filled] * means
+    cv_values[filled] = numpy.sqrt(
+        numpy.maximum(deviations, 0) / counts[filled]) / (shift + means)
+
+    # In windows where the ISIs vary much less than around shift (e.g. a
+    # single ISI or regular spiking), the cumulative sums leave too few
+    # significant digits of the variance: collect their ISIs instead
+    unstable = numpy.zeros(len(windows), dtype=bool)
+    unstable[filled] = deviations <= 1e10 * numpy.finfo(float).eps * (
+        errors[filled] + sums[filled] * means)
+    for i in numpy.nonzero(unstable)[0]:
+        window_isis = numpy.concatenate(
+            [isi[first[i]:last[i]] for isi, (first, last) in zip(
+                isis, ranges)])
+        cv_values[i] = window_isis.std() / window_isis.mean()
 
     return cv_values, windows
 
@@ -420,10 +661,14 @@ def peth(sts, w, t_start=None, t_stop=None, output='counts', clip=False):
 
     Parameters
     ----------
-    sts : list of neo.core.SpikeTrain objects
+    sts : list of neo.core.SpikeTrain objects, or spike_index
         Spiketrains with a common time axis (same t_start and t_stop)
     w : Quantity
-        width of the histogram's time bins.
+        width of the histogram's time bins. If w is an array of widths,
+        which must be integer multiples of the smallest one, the spike
+        trains are binned only once with the smallest width and the PETHs
+        at the larger widths are obtained by summing groups of bins (see
+        peth_pyramid).
     t_start, t_stop : Quantity (optional)
         Start and stop time of the histogram. Only events in the input
         spike trains falling between t_start and t_stop (both included) are
@@ -444,48 +689,51 @@ def peth(sts, w, t_start=None, t_stop=None, output='counts', clip=False):
         neo.core.AnalogSignal object containing the PETH values.
         AnalogSignal[j] is the PETH computed between
         t_start + j * w and t_start + (j + 1) * w.
+        If w is an array, a list of such objects, one for each width.
 
     """
+    if w.ndim > 0:
+        pyramid = peth_pyramid(sts, w.min(), t_start=t_start, t_stop=t_stop)
+        return [pyramid.peth(wi, output=output, clip=clip) for wi in w]
 
     # Find the internal range t_start, t_stop where all spike trains are
-    # defined; cut all spike trains taking that time range only
-    max_tstart = max([t.t_start for t in sts])
-    min_tstop = min([t.t_stop for t in sts])
+    # defined
+    t_start, t_stop = _common_range(sts, t_start, t_stop)
 
-    if t_start is None:
-        t_start = max_tstart
-        if not all([max_tstart == t.t_start for t in sts]):
-            warnings.warn(
-                "Spiketrains have different t_start values -- "
-                "using maximum t_start as t_start.")
+    if isinstance(sts, spike_index):
+        bin_hist = sts.bin_counts(
+            w, t_start, t_stop, clip=clip is True).astype(float)
+    else:
+        # Cut all spike trains taking that time range only
+        sts_cut = [st.time_slice(t_start=t_start, t_stop=t_stop)
+                   for st in sts]
 
-    if t_stop is None:
-        t_stop = min_tstop
-        if not all([min_tstop == t.t_stop for t in sts]):
-            warnings.warn(
-                "Spiketrains have different t_stop values -- "
-                "using minimum t_stop as t_stop.")
+        # Bin the spike trains and sum across columns
+        bs = rep.binned_st(sts_cut, t_start=t_start, t_stop=t_stop,
+                           binsize=w)
 
-    sts_cut = [st.time_slice(t_start=t_start, t_stop=t_stop) for st in sts]
+        bin_hist = np.asarray(
+            bs.to_sparse(clip=clip is True).sum(axis=0), dtype=float).ravel()
 
-    # Bin the spike trains and sum across columns
-    bs = rep.binned_st(sts_cut, t_start=t_start, t_stop=t_stop, binsize=w)
+    return _peth_signal(bin_hist, w, t_start, len(sts), output)
 
-    if clip is True:
-        bin_hist = np.sum(bs.matrix_clipped(), axis=0)
-    else:
-        bin_hist = np.sum(bs.matrix_unclipped(), axis=0)
 
+def _peth_signal(bin_hist, w, t_start, num_trains, output):
+    """
+    Supplementary function of peth() and peth_pyramid: returns the
+    histogram bin_hist of num_trains spike trains, with bins of width w
+    from t_start, as an AnalogSignal normalized according to output.
+    """
     # Renormalise the histogram
     if output == 'counts':
         # Raw
         bin_hist = bin_hist * pq.dimensionless
     elif output == 'mean':
         # Divide by number of input spike trains
-        bin_hist = bin_hist * 1. / len(sts) * pq.dimensionless
+        bin_hist = bin_hist * 1. / num_trains * pq.dimensionless
     elif output == 'rate':
         # Divide by number of input spike trains and bin width
-        bin_hist = bin_hist * 1. / len(sts) / w
+        bin_hist = bin_hist * 1. / num_trains / w
     else:
         raise ValueError('Parameter output is not valid.')
 
@@ -493,6 +741,242 @@ def peth(sts, w, t_start=None, t_stop=None, output='counts', clip=False):
         signal=bin_hist, sampling_period=w, t_start=t_start)
 
 
+class peth_pyramid(object):
+    """
+    PETHs of a list of spike trains at several bin widths, all integer
+    multiples of a base width w.
+
+    The spike trains are binned only once, with bins of width w; the PETH
+    at a width k * w is obtained by summing groups of k consecutive bins
+    (dropping the last bins which do not fill a group, as peth() drops the
+    time after the last full bin), and is cached for further requests.
+    Each bin of width k * w is thus exactly the union of k bins of width w:
+    only spikes within rounding error of a bin edge may fall in a different
+    bin than with peth() at that width.
+
+    Parameters
+    ----------
+    sts : list of neo.core.SpikeTrain objects, or spike_index
+        Spiketrains with a common time axis (same t_start and t_stop)
+    w : Quantity
+        width of the finest time bins.
+    t_start, t_stop : Quantity (optional)
+        Start and stop time of the histograms, as for peth().
+        Default: t_start=t_stop=None
+
+    Example
+    -------
+    >>> pyramid = peth_pyramid(sts, 1 * pq.ms)
+    >>> hists = [pyramid.peth(w) for w in [1, 2, 5, 10, 20, 50] * pq.ms]
+    """
+
+    def __init__(self, sts, w, t_start=None, t_stop=None):
+        t_start, t_stop = _common_range(sts, t_start, t_stop)
+        self.w = w
+        self.t_start = t_start
+        self.t_stop = t_stop
+        self.num_trains = len(sts)
+
+        # Bin index, spike train index and number of spikes of each filled
+        # bin of each spike train
+        if isinstance(sts, spike_index):
+            bins, ids, num_bins = sts.bin_indices(w, t_start, t_stop)
+            counts = numpy.ones(len(bins))
+        else:
+            sts_cut = [st.time_slice(t_start=t_start, t_stop=t_stop)
+                       for st in sts]
+            bs = rep.binned_st(sts_cut, t_start=t_start, t_stop=t_stop,
+                               binsize=w)
+            mat = bs.to_sparse().tocoo()
+            bins, ids, counts = mat.col, mat.row, mat.data
+            num_bins = bs.num_bins
+        self.num_bins = num_bins
+        self._bins, self._ids = bins, ids
+        self._hists = {
+            (1, False): numpy.bincount(
+                bins, weights=counts, minlength=num_bins).astype(float)}
+
+    def _factor(self, w):
+        # Integer number of bins of the pyramid in a bin of width w
+        factor = float((w / self.w).simplified)
+        rounded = int(round(factor))
+        if rounded < 1 or abs(factor - rounded) > 1e-9 * factor:
+            raise ValueError(
+                'w (%s) must be an integer multiple of the bin width of the '
+                'pyramid (%s)' % (w, self.w))
+        return rounded
+
+    def counts(self, w, clip=False):
+        """
+        Returns the number of spikes (optionally clipped to one spike per
+        spike train) in each bin of width w, an integer multiple of the
+        width of the pyramid, from t_start.
+        """
+        factor = self._factor(w)
+        key = (factor, clip is True)
+        if key not in self._hists:
+            num_bins = self.num_bins // factor
+            if clip is True:
+                # Filled bins of each spike train at width w
+                in_range = self._bins < num_bins * factor
+                bins = numpy.unique(
+                    self._ids[in_range] * num_bins +
+                    self._bins[in_range] // factor) % num_bins
+                self._hists[key] = numpy.bincount(
+                    bins, minlength=num_bins).astype(float)
+            else:
+                hist = self._hists[(1, False)][:num_bins * factor]
+                self._hists[key] = hist.reshape(num_bins, factor).sum(axis=1)
+        return self._hists[key]
+
+    def peth(self, w, output='counts', clip=False):
+        """
+        Returns the PETH with bins of width w, an integer multiple of the
+        width of the pyramid, normalized as by peth() according to output.
+        """
+        return _peth_signal(self.counts(w, clip=clip), w, self.t_start,
+                            self.num_trains, output)
+
+
+def aligned_peth(spiketrain, triggers, w, t_start, t_stop, output='counts',
+                 clip=False, trial_counts=False):
+    """
+    Peri-Event Time Histogram (PETH) of one continuous spike train aligned
+    to trigger times, e.g. the onsets of the trials.
+
+    The result equals peth() of the list of spike trains obtained by
+    cutting spiketrain from trigger + t_start to trigger + t_stop for each
+    trigger and shifting it by -trigger, but the spikes of each trial are
+    found by binary search in spiketrain and binned at once, without
+    building a SpikeTrain for each trial.
+
+    Parameters
+    ----------
+    spiketrain : neo.core.SpikeTrain
+        the continuous spike train
+    triggers : Quantity array, or neo.core.EventArray
+        the trigger times, one for each trial
+    w : Quantity
+        width of the histogram's time bins.
+    t_start, t_stop : Quantity
+        Start and stop time of the histogram, relative to the triggers (e.g.
+        -100 * pq.ms and 500 * pq.ms). Only spikes falling between
+        trigger + t_start and trigger + t_stop (both included) are
+        considered in the histogram; windows of different trials may
+        overlap. Parts of the windows outside the spike train contain no
+        spikes.
+    output : str (optional)
+        Normalization of the histogram, as for peth(), the trials taking the
+        place of the spike trains:
+        * 'counts': spike counts at each bin (as integer numbers)
+        * 'mean': mean spike counts per trial
+        * 'rate': mean spike rate per trial. Like 'mean', but the counts are
+          additionally normalized by the bin width.
+    clip : bool (optional)
+        If True, at most one spike is counted in each bin of each trial.
+        Default: False
+    trial_counts : bool (optional)
+        If True, the number of spikes in each bin of each trial is returned
+        as well.
+        Default: False
+
+    Returns
+    -------
+    analogSignal : neo.core.AnalogSignal
+        neo.core.AnalogSignal object containing the PETH values.
+        AnalogSignal[j] is the PETH computed between
+        t_start + j * w and t_start + (j + 1) * w after the triggers.
+    counts : ndarray, shape (number of triggers, number of bins)
+        The spike counts (clipped if clip is True) of each trial, only
+        returned if trial_counts is True.
+
+    Example
+    -------
+    >>> hist = aligned_peth(st, trials.times, 5 * pq.ms, -100 * pq.ms,
+    ...                     500 * pq.ms, output='rate')
+    """
+    if hasattr(triggers, 'times'):
+        triggers = triggers.times
+    units = spiketrain.units
+    triggers = numpy.atleast_1d(triggers.rescale(units).magnitude).ravel()
+    times = spiketrain.magnitude.ravel()
+    if numpy.any(numpy.diff(times) < 0):
+        times = numpy.sort(times)
+    num_bins = rep.calc_num_bins(w, t_start, t_stop)
+    offset = float(t_start.rescale(units).magnitude)
+    end = float(t_stop.rescale(units).magnitude)
+
+    # Range of the spikes of each trial in times, and the trial of each
+    # spike in these ranges (the same spike may belong to several trials)
+    first = times.searchsorted(triggers + offset, side='left')
+    stop = numpy.maximum(
+        times.searchsorted(triggers + end, side='right'), first)
+    lengths = stop - first
+    trials = numpy.repeat(numpy.arange(len(triggers)), lengths)
+    spikes = numpy.arange(lengths.sum()) + numpy.repeat(
+        first - numpy.cumsum(lengths) + lengths, lengths)
+
+    # Bin the spike times relative to the triggers, as by rep.binned_st()
+    factor = float(units.rescale(w.units).magnitude)
+    bins = (times[spikes] - triggers[trials] - offset) * factor / \
+        float(w.magnitude)
+    in_range = bins >= 0
+    bins, trials = bins[in_range].astype(int), trials[in_range]
+    in_range = bins < num_bins
+    bins, trials = bins[in_range], trials[in_range]
+
+    filled = trials * num_bins + bins
+    if clip is True:
+        filled = numpy.unique(filled)
+    if trial_counts:
+        counts = numpy.bincount(
+            filled, minlength=len(triggers) * num_bins).reshape(
+            len(triggers), num_bins)
+        bin_hist = counts.sum(axis=0).astype(float)
+    else:
+        bin_hist = numpy.bincount(
+            filled % num_bins, minlength=num_bins).astype(float)
+
+    hist = _peth_signal(bin_hist, w, t_start, len(triggers), output)
+    if trial_counts:
+        return hist, counts
+    return hist
+
+
+def _common_range(sts, t_start, t_stop):
+    """
+    Supplementary function of peth() and complexity_histogram(): returns
+    t_start and t_stop, which default to the maximum t_start and the minimum
+    t_stop of the spike trains (or spike_index) sts, with a warning if the
+    spike trains have different ones.
+    """
+    if isinstance(sts, spike_index):
+        max_tstart, min_tstop = sts.t_start, sts.t_stop
+        same_tstart, same_tstop = sts._same_range
+    else:
+        max_tstart = max([t.t_start for t in sts])
+        min_tstop = min([t.t_stop for t in sts])
+        if t_start is None:
+            same_tstart = all([max_tstart == t.t_start for t in sts])
+        if t_stop is None:
+            same_tstop = all([min_tstop == t.t_stop for t in sts])
+
+    if t_start is None:
+        t_start = max_tstart
+        if not same_tstart:
+            warnings.warn(
+                "Spiketrains have different t_start values -- "
+                "using maximum t_start as t_start.")
+
+    if t_stop is None:
+        t_stop = min_tstop
+        if not same_tstop:
+            warnings.warn(
+                "Spiketrains have different t_stop values -- "
+                "using minimum t_stop as t_stop.")
+    return t_start, t_stop
+
+
 def complexity(
         sts, w, empty_bin=False, t_start=None, t_stop=None,
         output='normalized'):
@@ -501,7 +985,7 @@ def complexity(
 
     Parameters
     ----------
-    sts : list of SpikeTrain
+    sts : list of SpikeTrain, or spike_index
         spike trains with a common time axis (same t_start and t_stop)
     w : Quantity
         width of the population histogram (peth)'s time bins.
@@ -557,7 +1041,7 @@ def complexity_histogram(
 
     Parameters
     ----------
-    sts : list of neo.core.SpikeTrain objects
+    sts : list of neo.core.SpikeTrain objects, or spike_index
         Spike trains with a common time axis (same t_start and t_stop)
     w : Quantity
         Width of the time bins of the complexity histogram.
@@ -579,43 +1063,36 @@ def complexity_histogram(
     """
 
     # Find the internal range t_start, t_stop where all spike trains are
-    # defined; cut all spike trains taking that time range only
-    max_tstart = max([t.t_start for t in sts])
-    min_tstop = min([t.t_stop for t in sts])
-
-    if t_start is None:
-        t_start = max_tstart
-        if not all([max_tstart == t.t_start for t in sts]):
-            warnings.warn(
-                "Spiketrains have different t_start values -- "
-                "using maximum t_start as t_start.")
+    # defined
+    t_start, t_stop = _common_range(sts, t_start, t_stop)
 
-    if t_stop is None:
-        t_stop = min_tstop
-        if not all([min_tstop == t.t_stop for t in sts]):
-            warnings.warn(
-                "Spiketrains have different t_stop values -- "
-                "using minimum t_stop as t_stop.")
+    if isinstance(sts, spike_index):
+        counts = sts.bin_counts(w, t_start, t_stop)
+        num_bins = len(counts)
+    else:
+        # Cut all spike trains taking that time range only
+        sts_cut = [st.time_slice(t_start=t_start, t_stop=t_stop)
+                   for st in sts]
 
-    sts_cut = [st.time_slice(t_start=t_start, t_stop=t_stop) for st in sts]
+        # Bin the spike trains and take the sparse matrix of spike counts
+        binned_sts = rep.binned_st(sts_cut, t_start=t_start, t_stop=t_stop,
+                                   binsize=w)
+        mat = binned_sts.to_sparse()
+        num_bins = binned_sts.num_bins
 
-    # Bin the spike trains and take the lists of filled bins
-    binned_sts = rep.binned_st(sts_cut, t_start=t_start, t_stop=t_stop,
-                               binsize=w)
-    filled_bins = numpy.sort(numpy.hstack(binned_sts.filled))
+        # Compute the number of spikes in each bin
+        counts = numpy.bincount(mat.indices, weights=mat.data,
+                                minlength=num_bins)
 
-    # Compute the complexities from the filled bins
-    filled_bins_ext = numpy.hstack([filled_bins, filled_bins[-1] + 1])
-    filled_bins_diff_non0 = numpy.where(numpy.diff(filled_bins_ext) != 0)[0]
-    complexities = numpy.hstack([filled_bins_diff_non0[0] + 1, numpy.diff(
-        filled_bins_diff_non0)])
+    # Compute the complexities (number of spikes) of the filled bins
+    complexities = counts[counts > 0]
 
     # Compute the complexity histogram, from 1 to n=len(sts)
     complexity_hist, edges = numpy.histogram(
         complexities, bins=numpy.arange(len(sts) + 2))
 
     # Compute the histogram at complexity 0
-    complexity_hist[0] = binned_sts.num_bins - numpy.sum(complexity_hist)
+    complexity_hist[0] = num_bins - numpy.sum(complexity_hist)
 
     return neo.AnalogSignal(signal=complexity_hist * pq.dimensionless,
                             t_start=0 * pq.dimensionless,
@@ -729,8 +1206,7 @@ def ISIpdf(x, bins=10, range=None, density=False):
     if type(x) == neo.core.SpikeTrain: x = [x]
 
     # Collect all ISIs from each spike train in x (as arrays, meant in s)
-    ISIs = []
-    for t in x: ISIs = numpy.hstack([ISIs, numpy.diff(t.simplified.magnitude)])
+    ISIs = _pooled_isis(x)
 
     # If bins is a Quantity, convert it to an array (meant in seconds)
     if type(bins) == pq.quantity.Quantity:
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the rate_estimation module.
+
+:copyright: Copyright 2014 by the Elephant team, see AUTHORS.txt.
+:license: Modified BSD, see LICENSE.txt for details.
+"""
+
+import unittest
+
+import neo
+import numpy as np
+from numpy.testing.utils import assert_array_almost_equal
+import quantities as pq
+import scipy.signal
+
+import elephant.rate_estimation as re
+import elephant.rep as rep
+
+
+class make_kernel_TestCase(unittest.TestCase):
+    def setUp(self):
+        re.kernel_cache_clear(maxsize=128)
+
+    def tearDown(self):
+        re.kernel_cache_clear(maxsize=128)
+
+    def test_kernel_forms(self):
+        for form in ['BOX', 'TRI', 'GAU', 'EPA', 'EXP', 'ALP']:
+            kernel, norm, m_idx = re.make_kernel(form, 10 * pq.ms,
+                                                 1 * pq.ms)
+            self.assertAlmostEqual(kernel.sum(), 1.)
+            self.assertEqual(kernel.size % 2, 1)
+            self.assertAlmostEqual(norm, 1000.)
+            self.assertTrue(kernel[:m_idx + 1].sum() >= 0.5)
+
+    def test_cache_hits_and_misses(self):
+        kernel, norm, m_idx = re.make_kernel('GAU', 10 * pq.ms, 1 * pq.ms)
+        self.assertEqual(re.kernel_cache_info(), (0, 1, 128, 1))
+        # sigma and resolution are compared in seconds, form in upper case
+        kernel2 = re.make_kernel('gau', 0.01 * pq.s, 1000 * pq.us)[0]
+        self.assertTrue(kernel2 is kernel)
+        self.assertEqual(re.kernel_cache_info(), (1, 1, 128, 1))
+        # the direction only matters for asymmetric kernels
+        re.make_kernel('GAU', 10 * pq.ms, 1 * pq.ms, direction=-1)
+        re.make_kernel('EXP', 10 * pq.ms, 1 * pq.ms)
+        exp_reversed = re.make_kernel('EXP', 10 * pq.ms, 1 * pq.ms,
+                                      direction=-1)[0]
+        self.assertEqual(re.kernel_cache_info(), (2, 3, 128, 3))
+        assert_array_almost_equal(
+            exp_reversed, re.make_kernel('EXP', 10 * pq.ms, 1 * pq.ms,
+                                         cache=False)[0][::-1])
+
+    def test_kernel_read_only(self):
+        kernel = re.make_kernel('TRI', 5 * pq.ms, 1 * pq.ms)[0]
+        self.assertFalse(kernel.flags.writeable)
+        self.assertRaises(ValueError, kernel.__setitem__, 0, 1.)
+
+    def test_lru_eviction(self):
+        re.kernel_cache_clear(maxsize=2)
+        re.make_kernel('BOX', 1 * pq.ms, 1 * pq.ms)
+        re.make_kernel('BOX', 2 * pq.ms, 1 * pq.ms)
+        re.make_kernel('BOX', 1 * pq.ms, 1 * pq.ms)
+        re.make_kernel('BOX', 3 * pq.ms, 1 * pq.ms)
+        self.assertEqual(re.kernel_cache_info(), (1, 3, 2, 2))
+        re.make_kernel('BOX', 1 * pq.ms, 1 * pq.ms)
+        re.make_kernel('BOX', 2 * pq.ms, 1 * pq.ms)
+        self.assertEqual(re.kernel_cache_info(), (2, 4, 2, 2))
+        re.kernel_cache_clear(maxsize=0)
+        re.make_kernel('BOX', 1 * pq.ms, 1 * pq.ms)
+        self.assertEqual(re.kernel_cache_info(), (0, 0, 0, 0))
+
+
+class instantaneous_rates_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(7)
+        self.sts = [neo.SpikeTrain(
+            np.sort(np.random.uniform(0, 2, n)), units='s',
+            t_start=0 * pq.s, t_stop=2 * pq.s) for n in [0, 1, 20, 50]]
+        self.sts.append(neo.SpikeTrain(
+            [0, 500, 2000], units='ms', t_start=0 * pq.ms,
+            t_stop=2000 * pq.ms))
+
+    def test_equal_to_instantaneous_rate(self):
+        for form in ['GAU', 'EXP', 'BOX']:
+            for trim in [False, True]:
+                rates = re.instantaneous_rates(
+                    self.sts, 1 * pq.ms, form, 10 * pq.ms, trim=trim)
+                self.assertTrue(isinstance(rates, neo.AnalogSignalArray))
+                self.assertEqual(rates.shape[1], len(self.sts))
+                for i, st in enumerate(self.sts):
+                    rate = re.instantaneous_rate(
+                        st, 1 * pq.ms, form, 10 * pq.ms, trim=trim)
+                    self.assertEqual(rates.shape[0], rate.shape[0])
+                    assert_array_almost_equal(
+                        rates.magnitude[:, i], rate.magnitude)
+                    self.assertAlmostEqual(
+                        float(rates.t_start.rescale('s')),
+                        float(rate.t_start.rescale('s')))
+
+    def test_window(self):
+        rates = re.instantaneous_rates(
+            self.sts, 0.5 * pq.ms, 'TRI', 5 * pq.ms, t_start=0.3 * pq.s,
+            t_stop=1500 * pq.ms)
+        for i, st in enumerate(self.sts):
+            rate = re.instantaneous_rate(
+                st, 0.5 * pq.ms, 'TRI', 5 * pq.ms, t_start=0.3 * pq.s,
+                t_stop=1500 * pq.ms)
+            assert_array_almost_equal(rates.magnitude[:, i], rate.magnitude)
+
+    def test_binned_st(self):
+        # the last spike train has a spike at t_stop, excluded by binned_st
+        x = rep.binned_st(self.sts[:-1], binsize=1 * pq.ms)
+        rates = re.instantaneous_rates(x, None, 'GAU', 10 * pq.ms)
+        assert_array_almost_equal(
+            rates.magnitude, re.instantaneous_rates(
+                self.sts[:-1], 1 * pq.ms, 'GAU', 10 * pq.ms).magnitude)
+        self.assertRaises(ValueError, re.instantaneous_rates, x, 2 * pq.ms,
+                          'GAU', 10 * pq.ms)
+
+    def test_different_t_start(self):
+        st = neo.SpikeTrain([0.5], units='s', t_start=-1 * pq.s,
+                            t_stop=2 * pq.s)
+        self.assertRaises(ValueError, re.instantaneous_rates,
+                          self.sts + [st], 1 * pq.ms, 'GAU', 10 * pq.ms)
+        rates = re.instantaneous_rates(
+            self.sts + [st], 1 * pq.ms, 'GAU', 10 * pq.ms, t_start=-1 * pq.s)
+        self.assertEqual(rates.shape, (3000, 6))
+
+    def test_methods(self):
+        for trim in [False, True]:
+            rates_fft = re.instantaneous_rates(
+                self.sts, 1 * pq.ms, 'EPA', 20 * pq.ms, trim=trim,
+                method='fft')
+            rates_sparse = re.instantaneous_rates(
+                self.sts, 1 * pq.ms, 'EPA', 20 * pq.ms, trim=trim,
+                method='sparse')
+            assert_array_almost_equal(rates_fft.magnitude,
+                                      rates_sparse.magnitude)
+            for st in self.sts:
+                rate_fft = re.instantaneous_rate(
+                    st, 0.1 * pq.ms, 'ALP', 5 * pq.ms, trim=trim,
+                    method='fft')
+                rate_sparse = re.instantaneous_rate(
+                    st, 0.1 * pq.ms, 'ALP', 5 * pq.ms, trim=trim,
+                    method='sparse')
+                assert_array_almost_equal(rate_fft.magnitude,
+                                          rate_sparse.magnitude)
+        self.assertRaises(ValueError, re.instantaneous_rate, self.sts[1],
+                          1 * pq.ms, 'GAU', 10 * pq.ms, method='direct')
+
+
+class bandwidth_cost_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(5)
+        # inhomogeneous Poisson process, 10 Hz +/- 8 Hz with period 1 s
+        times = np.sort(np.random.uniform(0, 10, 180))
+        keep = np.random.uniform(size=times.size) < (
+            10 + 8 * np.sin(2 * np.pi * times)) / 18.
+        self.st = neo.SpikeTrain(times[keep], units='s', t_start=0 * pq.s,
+                                 t_stop=10 * pq.s)
+        self.sigmas = np.array([2, 10, 50, 100, 200, 1000]) * pq.ms
+
+    def test_equal_to_direct_cost(self):
+        bins = (self.st.magnitude * 1000).astype(int)
+        spike_data = np.zeros(10001)
+        spike_data[bins] = 1
+        for form in ['GAU', 'EXP', 'TRI']:
+            costs = re.bandwidth_cost(self.st, 1 * pq.ms, form, self.sigmas)
+            for sigma, cost in zip(self.sigmas, costs):
+                kernel, norm, m_idx = re.make_kernel(form, sigma, 1 * pq.ms)
+                rate = norm * np.convolve(spike_data, kernel)
+                leave_one_out = rate[bins + m_idx] - norm * kernel[m_idx]
+                self.assertAlmostEqual(
+                    cost, np.sum(rate ** 2) / norm -
+                    2 * np.sum(leave_one_out), places=6)
+
+    def test_dense_and_sparse_autocorrelation(self):
+        bins = np.sort(np.random.choice(1000, 300, replace=False))
+        dense = re._bins_autocorrelation(bins, 1000, 2000)
+        sparse = re._bins_autocorrelation(bins[::30], 1000, 20)
+        spike_data = np.zeros(1000)
+        spike_data[bins] = 1
+        counts = np.correlate(spike_data, spike_data, 'full')[999:]
+        assert_array_almost_equal(dense[:1000], counts)
+        self.assertEqual(dense[1000:].sum(), 0)
+        spike_data[:] = 0
+        spike_data[bins[::30]] = 1
+        counts = np.correlate(spike_data, spike_data, 'full')[999:]
+        assert_array_almost_equal(sparse, counts[:21])
+
+    def test_optimal_instantaneous_rate(self):
+        sigma, rate = re.optimal_instantaneous_rate(
+            self.st, 1 * pq.ms, sigmas=self.sigmas)
+        costs = re.bandwidth_cost(self.st, 1 * pq.ms, 'GAU', self.sigmas)
+        self.assertEqual(sigma, self.sigmas[np.argmin(costs)])
+        assert_array_almost_equal(
+            rate.magnitude,
+            re.instantaneous_rate(self.st, 1 * pq.ms, 'GAU', sigma).magnitude)
+        sigma, rate = re.optimal_instantaneous_rate(self.st, 10 * pq.ms)
+        self.assertTrue(20 * pq.ms < sigma < 1 * pq.s)
+        self.assertEqual(rate.shape, (1000,))
+
+
+class causal_rate_estimator_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(11)
+        self.spikes = np.sort(np.random.uniform(1, 3, 80))
+
+    def test_equal_to_causal_filter(self):
+        for form in ['EXP', 'ALP']:
+            estimator = re.causal_rate_estimator(
+                form, 10 * pq.ms, 1 * pq.ms, t_start=1000 * pq.ms)
+            rates = []
+            t = 1.
+            for t_stop in list(np.sort(np.random.uniform(1, 3, 20))) + [3.]:
+                spikes = self.spikes[(self.spikes >= t) &
+                                     (self.spikes < t_stop)]
+                rates.append(estimator.update(spikes * pq.s, t_stop * pq.s))
+                t = t_stop
+            self.assertEqual(rates[0].t_start, 1000 * pq.ms)
+            self.assertEqual(estimator.t_stop, 3 * pq.s)
+            rate = np.concatenate([r.magnitude.ravel() for r in rates])
+            self.assertEqual(rate.size, 2000)
+
+            kernel, norm, m_idx = re.make_kernel(form, 10 * pq.ms, 1 * pq.ms)
+            spike_data = np.zeros(2000)
+            spike_data[((self.spikes - 1) * 1000).astype(int)] = 1
+            assert_array_almost_equal(
+                rate, norm * scipy.signal.lfilter(kernel, 1, spike_data),
+                decimal=8)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, re.causal_rate_estimator, 'GAU',
+                          10 * pq.ms, 1 * pq.ms)
+        estimator = re.causal_rate_estimator('exp', 10 * pq.ms, 1 * pq.ms)
+        rate = estimator.update([0.5] * pq.ms, 10.5 * pq.ms)
+        self.assertEqual(rate.size, 10)
+        self.assertEqual(estimator.update([] * pq.ms, 10.9 * pq.ms).size, 0)
+        self.assertRaises(ValueError, estimator.update, [10.4] * pq.ms,
+                          11 * pq.ms)
+        self.assertRaises(ValueError, estimator.update, [11] * pq.ms,
+                          11 * pq.ms)
+        self.assertRaises(ValueError, estimator.update, [] * pq.ms,
+                          10 * pq.ms)
+
+
+if __name__ == '__main__':
+    unittest.main()
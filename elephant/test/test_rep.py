@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the rep module.
+
+:copyright: Copyright 2014 by the Elephant team, see AUTHORS.txt.
+:license: Modified BSD, see LICENSE.txt for details.
+"""
+
+import unittest
+
+import neo
+import numpy as np
+from numpy.testing.utils import assert_array_equal
+import quantities as pq
+import scipy.sparse as sps
+
+import elephant.rep as rep
+
+
+class binned_st_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.spiketrain_a = neo.SpikeTrain(
+            [0.5, 0.7, 1.2, 3.1, 4.3, 5.5, 6.7] * pq.s, t_stop=10.0 * pq.s)
+        self.spiketrain_b = neo.SpikeTrain(
+            [0.1, 0.7, 1.2, 2.2, 4.3, 5.5, 8.0] * pq.s, t_stop=10.0 * pq.s)
+        self.binsize = 1 * pq.s
+
+    def test_binned_st_filled(self):
+        x = rep.binned_st(self.spiketrain_a, num_bins=10,
+                          binsize=self.binsize, t_start=0 * pq.s)
+        self.assertEqual(len(x.filled), 1)
+        assert_array_equal(x.filled[0], [0, 0, 1, 3, 4, 5, 6])
+
+    def test_binned_st_matrices(self):
+        x = rep.binned_st([self.spiketrain_a, self.spiketrain_b],
+                          binsize=self.binsize, t_start=0 * pq.s,
+                          t_stop=10. * pq.s)
+        target_u = np.array([[2, 1, 0, 1, 1, 1, 1, 0, 0, 0],
+                             [2, 1, 1, 0, 1, 1, 0, 0, 1, 0]])
+        assert_array_equal(x.matrix_unclipped(), target_u)
+        assert_array_equal(x.matrix_clipped(), target_u > 0)
+
+    def test_binned_st_to_sparse(self):
+        x = rep.binned_st([self.spiketrain_a, self.spiketrain_b],
+                          binsize=self.binsize, t_start=0 * pq.s,
+                          t_stop=10. * pq.s)
+        mat_u = x.to_sparse()
+        mat_c = x.to_sparse(clip=True)
+        self.assertTrue(sps.isspmatrix_csr(mat_u))
+        self.assertEqual(mat_u.shape, (2, 10))
+        self.assertEqual(mat_u.nnz, 12)
+        assert_array_equal(mat_u.toarray(), x.matrix_unclipped())
+        assert_array_equal(mat_c.toarray(), x.matrix_clipped())
+        # Clipping must not alter the stored counts
+        self.assertEqual(x.to_sparse().max(), 2)
+
+    def test_binned_st_matrices_dtype(self):
+        x = rep.binned_st([self.spiketrain_a, self.spiketrain_b],
+                          binsize=self.binsize, t_start=0 * pq.s,
+                          t_stop=10. * pq.s)
+        mat_u = x.matrix_unclipped(dtype=np.uint8)
+        mat_c = x.matrix_clipped(dtype='int32')
+        self.assertEqual(mat_u.dtype, np.uint8)
+        self.assertEqual(mat_c.dtype, np.int32)
+        assert_array_equal(mat_u, x.matrix_unclipped())
+        assert_array_equal(mat_c, x.matrix_clipped())
+
+    def test_binned_st_matrices_dtype_overflow(self):
+        st = neo.SpikeTrain(np.linspace(0, 0.9, 300) * pq.s,
+                            t_stop=10. * pq.s)
+        x = rep.binned_st(st, binsize=self.binsize, t_start=0 * pq.s,
+                          t_stop=10. * pq.s)
+        self.assertRaises(ValueError, x.matrix_unclipped, dtype=np.uint8)
+        self.assertEqual(x.matrix_unclipped(dtype=np.uint16)[0, 0], 300)
+        self.assertEqual(x.matrix_clipped(dtype=np.uint8)[0, 0], 1)
+
+    def test_binned_st_store_mat(self):
+        x = rep.binned_st([self.spiketrain_a, self.spiketrain_b],
+                          binsize=self.binsize, t_start=0 * pq.s,
+                          t_stop=10. * pq.s, store_mat=True)
+        mat_u = x.matrix_unclipped()
+        # Both matrices are computed at once and returned when stored
+        self.assertTrue(x.mat_c is not None)
+        self.assertTrue(x.matrix_unclipped() is mat_u)
+        self.assertTrue(x.matrix_clipped() is x.mat_c)
+        assert_array_equal(x.mat_c, mat_u > 0)
+
+    def test_binned_st_ignores_spikes_out_of_range(self):
+        st = neo.SpikeTrain([0.2, 1.5, 2.5, 9.5] * pq.s, t_stop=10 * pq.s)
+        x = rep.binned_st(st, binsize=self.binsize, t_start=1 * pq.s,
+                          t_stop=9 * pq.s)
+        assert_array_equal(x.filled[0], [0, 1])
+        self.assertEqual(x.to_sparse().sum(), 2)
+
+    def test_binned_st_mixed_units(self):
+        st_ms = neo.SpikeTrain([500, 700, 1200, 3100] * pq.ms,
+                               t_stop=10000. * pq.ms)
+        x = rep.binned_st([self.spiketrain_a, st_ms], binsize=100 * pq.ms,
+                          t_start=0.25 * pq.s, t_stop=9.95 * pq.s)
+        assert_array_equal(x.filled[0], [2, 4, 9, 28, 40, 52, 64])
+        assert_array_equal(x.filled[1], [2, 4, 9, 28])
+
+    def test_binned_st_set_filled(self):
+        x = rep.binned_st(self.spiketrain_a, binsize=self.binsize,
+                          t_start=0 * pq.s, t_stop=10. * pq.s)
+        x.filled = [[2, 2, 7], [1]]
+        self.assertEqual(x.matrix_rows, 2)
+        assert_array_equal(x.to_sparse().toarray(),
+                           [[0, 0, 2, 0, 0, 0, 0, 1, 0, 0],
+                            [0, 1, 0, 0, 0, 0, 0, 0, 0, 0]])
+        assert_array_equal(x.prune().filled[0], [2, 7])
+
+
+class transactions_TestCase(unittest.TestCase):
+    def test_transactions(self):
+        st1 = neo.SpikeTrain([0.5, 0.7, 3.1] * pq.s, t_stop=5. * pq.s)
+        st2 = neo.SpikeTrain([0.1, 2.2, 3.3] * pq.s, t_stop=5. * pq.s)
+        trans = rep.transactions([('a', st1), ('b', st2)], 1 * pq.s)
+        self.assertEqual(trans, [['a', 'b'], [], ['b'], ['a', 'b'], []])
+
+
+if __name__ == '__main__':
+    unittest.main()
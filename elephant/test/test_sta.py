@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the sta module.
+
+:copyright: Copyright 2014 by the Elephant team, see AUTHORS.txt.
+:license: Modified BSD, see LICENSE.txt for details.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import neo
+import numpy as np
+from numpy.testing.utils import assert_array_almost_equal
+import quantities as pq
+
+import elephant.sta as sta
+
+
+class sta_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(5)
+        self.lfps = [neo.AnalogSignal(np.random.randn(2000), units='mV',
+                                      sampling_rate=1 * pq.kHz,
+                                      t_start=0.25 * k * pq.s)
+                     for k in range(3)]
+        self.sts = [neo.SpikeTrain(
+            np.sort(np.random.uniform(0.25 * k + 0.125, 0.25 * k + 1.8, 40)),
+            units='s', t_start=(0.25 * k + 0.125) * pq.s,
+            t_stop=(0.25 * k + 1.875) * pq.s) for k in range(3)]
+
+    def _target(self, trial, window_bins):
+        # per-spike average of the lfp cutouts
+        lfp, st = self.lfps[trial], self.sts[trial]
+        offset = int(round(float(((st.t_start - lfp.t_start) *
+                                   lfp.sampling_rate).simplified)))
+        cutouts = []
+        for t in st.magnitude:
+            i = int(np.round((t - st.t_start.magnitude) * 1000)) + offset
+            if window_bins < i < len(lfp) - window_bins:
+                cutouts.append(lfp.magnitude[i - window_bins:
+                                             i + window_bins + 1])
+        return np.array(cutouts)
+
+    def test_sta_average(self):
+        result, time, used_spikes = sta.sta_average(
+            self.lfps, self.sts, 20 * pq.ms)
+        for trial in range(3):
+            cutouts = self._target(trial, 20)
+            self.assertEqual(used_spikes[trial], len(cutouts))
+            self.assertEqual(result[trial].units, pq.mV)
+            assert_array_almost_equal(result[trial].magnitude,
+                                      cutouts.mean(axis=0), decimal=12)
+            self.assertEqual(len(time[trial]), 41)
+
+    def test_sta_average_return_windows(self):
+        result, _, used_spikes, windows = sta.sta_average(
+            self.lfps[0], self.sts[0], 7, return_windows=True)
+        self.assertEqual(windows.shape, (used_spikes, 15))
+        assert_array_almost_equal(windows.magnitude, self._target(0, 7))
+        assert_array_almost_equal(windows.mean(axis=0).magnitude,
+                                  result.magnitude)
+
+    def test_sta_average_crosstrials(self):
+        result, _, _, windows = sta.sta_average(
+            self.lfps, self.sts, 7, crosstrials=True, return_windows=True)
+        target = np.concatenate([self._target(k, 7) for k in range(3)])
+        assert_array_almost_equal(windows.magnitude, target)
+        assert_array_almost_equal(result, target.mean(axis=0))
+
+    def test_sta_corr_equals_sta_average(self):
+        result_corr = sta.sta_corr(self.lfps, self.sts, 10)[0]
+        result_average = sta.sta_average(self.lfps, self.sts, 10)[0]
+        for trial in range(3):
+            assert_array_almost_equal(result_corr[trial].magnitude,
+                                      result_average[trial].magnitude)
+
+    def test_sta_corr_repeated_spikes(self):
+        st = neo.SpikeTrain([0.5, 0.5, 0.5, 0.9], units='s',
+                            t_stop=1.5 * pq.s)
+        result, _, used_spikes = sta.sta_corr(self.lfps[0], st, 3)
+        lfp = self.lfps[0].magnitude
+        self.assertEqual(used_spikes, 4)
+        assert_array_almost_equal(
+            result.magnitude, (3 * lfp[497:504] + lfp[897:904]) / 4.)
+
+    def test_n_jobs(self):
+        for func in [sta.sta_average, sta.sta_corr]:
+            for crosstrials in [False, True]:
+                target = func(self.lfps, self.sts, 10,
+                              crosstrials=crosstrials)
+                result = func(self.lfps, self.sts, 10,
+                              crosstrials=crosstrials, n_jobs=2)
+                assert_array_almost_equal(np.asarray(result[0]),
+                                          np.asarray(target[0]), decimal=12)
+                assert_array_almost_equal(result[2], target[2])
+        self.assertRaises(ValueError, sta.sta_average, self.lfps, self.sts,
+                          10, n_jobs=0)
+
+
+class sta_multichannel_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(6)
+        self.data = np.random.randn(3000, 5)
+        self.lfp = neo.AnalogSignalArray(self.data, units='uV',
+                                         sampling_rate=1 * pq.kHz)
+        self.st = neo.SpikeTrain(np.sort(np.random.uniform(0, 3, 80)),
+                                 units='s', t_stop=3 * pq.s)
+
+    def _target(self, func, window):
+        return np.array([func(neo.AnalogSignal(
+            self.data[:, ch], units='uV', sampling_rate=1 * pq.kHz),
+            self.st, window)[0].magnitude for ch in range(5)])
+
+    def test_sta_average(self):
+        result, time, used_spikes, windows = sta.sta_average(
+            self.lfp, self.st, 12, return_windows=True)
+        self.assertEqual(result.shape, (5, 25))
+        self.assertEqual(result.units, pq.uV)
+        self.assertEqual(len(time), 25)
+        self.assertEqual(windows.shape, (used_spikes, 5, 25))
+        assert_array_almost_equal(result.magnitude,
+                                  self._target(sta.sta_average, 12))
+        assert_array_almost_equal(windows.mean(axis=0).magnitude,
+                                  result.magnitude)
+
+    def test_sta_corr(self):
+        result = sta.sta_corr(self.lfp, self.st, 12)[0]
+        self.assertEqual(result.shape, (5, 25))
+        assert_array_almost_equal(result.magnitude,
+                                  self._target(sta.sta_corr, 12))
+
+    def test_crosstrials(self):
+        result = sta.sta_average([self.lfp, self.lfp[::-1]],
+                                 [self.st, self.st], 4 * pq.ms,
+                                 crosstrials=True)[0]
+        target = (sta.sta_average(self.lfp, self.st, 4)[0] +
+                  sta.sta_average(self.lfp[::-1], self.st, 4)[0]) / 2.
+        self.assertEqual(result.shape, (5, 9))
+        assert_array_almost_equal(result, target.magnitude)
+
+
+class memmap_lfp_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(7)
+        self.tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(self.tmpdir, 'lfp.dat')
+        data = np.memmap(filename, dtype='int16', mode='w+',
+                         shape=(4000, 3))
+        data[:] = np.random.randint(-100, 100, size=(4000, 3))
+        data.flush()
+        self.data = np.memmap(filename, dtype='int16', mode='r',
+                              shape=(4000, 3))
+        self.st = neo.SpikeTrain(np.sort(np.random.uniform(1, 2.5, 50)),
+                                 units='s', t_start=1 * pq.s,
+                                 t_stop=2.5 * pq.s)
+
+    def tearDown(self):
+        del self.data
+        shutil.rmtree(self.tmpdir)
+
+    def test_memmap_lfp(self):
+        lfp = sta.memmap_lfp(self.data, 2 * pq.kHz, t_start=0.5 * pq.s,
+                             units='uV')
+        self.assertTrue(isinstance(lfp, neo.AnalogSignalArray))
+        self.assertTrue(np.may_share_memory(np.asarray(lfp), self.data))
+        target = neo.AnalogSignalArray(np.array(self.data, dtype=float),
+                                       units='uV', sampling_rate=2 * pq.kHz,
+                                       t_start=0.5 * pq.s)
+        for func in [sta.sta_average, sta.sta_corr]:
+            result = func(lfp, self.st, 10 * pq.ms)[0]
+            assert_array_almost_equal(
+                result.magnitude,
+                func(target, self.st, 10 * pq.ms)[0].magnitude)
+        lfp = sta.memmap_lfp(self.data[:, 1], 2 * pq.kHz,
+                             t_start=0.5 * pq.s)
+        self.assertTrue(isinstance(lfp, neo.AnalogSignal))
+        self.assertRaises(ValueError, sta.memmap_lfp,
+                          self.data.reshape(2000, 2, 3), 2 * pq.kHz)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ docstring goes here.
 """
 
 import unittest
+import warnings
 
 import neo
 import numpy as np
@@ -301,5 +302,268 @@ class FanoFactorTestCase(unittest.TestCase):
         lst = [self.test_list[0]] * 3
         self.assertEqual(es.fanofactor(lst), 0.0)
 
+class pooled_isi_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.spiketrains = [
+            neo.SpikeTrain([0.5, 0.7, 1.2] * pq.s, t_stop=10.0 * pq.s),
+            neo.SpikeTrain([] * pq.s, t_stop=10.0 * pq.s),
+            neo.SpikeTrain([2000, 2100, 2600, 3600] * pq.ms,
+                           t_stop=10000 * pq.ms),
+            neo.SpikeTrain([4.] * pq.s, t_stop=10.0 * pq.s)]
+        self.isis = np.array([0.2, 0.5, 0.1, 0.5, 1.0])
+
+    def test_cv_pooled(self):
+        self.assertAlmostEqual(es.cv(self.spiketrains),
+                               self.isis.std() / self.isis.mean())
+        self.assertEqual(es.cv(self.spiketrains[1]), 0.)
+        self.assertEqual(es.cv(self.spiketrains[1:2] * 3), 0.)
+
+    def test_isi_pdf_pooled(self):
+        res = es.isi_pdf(self.spiketrains, bins=0.25 * pq.s)
+        targ = np.histogram(self.isis, np.arange(0.1, 1.2, 0.25))[0]
+        assert_array_almost_equal(res.magnitude.ravel(), targ)
+        self.assertAlmostEqual(float(res.t_start.rescale(pq.s)), 0.1)
+        vals, edges = es.ISIpdf(self.spiketrains, bins=0.25 * pq.s)
+        assert_array_almost_equal(vals, targ)
+
+
+class ff_timeresolved_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(3)
+        self.spiketrains = [neo.SpikeTrain(
+            np.sort(np.random.uniform(0, 5, np.random.poisson(20))) * pq.s,
+            t_stop=5 * pq.s) for i in range(10)]
+        self.spiketrains.append(
+            neo.SpikeTrain([1000, 1500, 2250] * pq.ms, t_stop=5000 * pq.ms))
+
+    def test_ff_timeresolved_equal_to_fanofactor(self):
+        values, windows = es.ff_timeresolved(
+            self.spiketrains, win=1 * pq.s, step=0.25 * pq.s)
+        self.assertEqual(windows.shape, (17, 2))
+        self.assertEqual(windows.units, pq.s)
+        for value, window in zip(values, windows):
+            sliced = [st.time_slice(window[0], window[1])
+                      for st in self.spiketrains]
+            self.assertAlmostEqual(value, es.fanofactor(sliced))
+
+    def test_ff_timeresolved_full_range(self):
+        values, windows = es.ff_timeresolved(self.spiketrains)
+        self.assertAlmostEqual(values[0], es.fanofactor(self.spiketrains))
+        assert_array_almost_equal(windows.magnitude, [[0, 5]])
+
+    def test_ff_timeresolved_empty(self):
+        st = neo.SpikeTrain([] * pq.s, t_stop=5 * pq.s)
+        values, windows = es.ff_timeresolved([st, st], win=1 * pq.s)
+        assert_array_almost_equal(values, np.zeros(5))
+
+
+class cv_timeresolved_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(6)
+        self.spiketrains = [neo.SpikeTrain(
+            np.sort(np.random.uniform(0, 5, np.random.poisson(20))) * pq.s,
+            t_stop=5 * pq.s) for i in range(10)]
+        self.spiketrains.append(
+            neo.SpikeTrain([1000, 1500, 2250] * pq.ms, t_stop=5000 * pq.ms))
+        self.spiketrains.append(
+            neo.SpikeTrain(np.arange(0.05, 5, 0.1) * pq.s, t_stop=5 * pq.s))
+
+    def test_cv_timeresolved_equal_to_cv(self):
+        for spiketrains in [self.spiketrains, self.spiketrains[-3:],
+                            self.spiketrains[-1:]]:
+            values, windows = es.cv_timeresolved(
+                spiketrains, win=1 * pq.s, step=0.25 * pq.s)
+            self.assertEqual(windows.shape, (17, 2))
+            for value, window in zip(values, windows):
+                sliced = [st.time_slice(window[0], window[1])
+                          for st in spiketrains]
+                self.assertAlmostEqual(value, es.cv(sliced), places=12)
+
+    def test_cv_timeresolved_full_range(self):
+        values, windows = es.cv_timeresolved(self.spiketrains[0])
+        self.assertAlmostEqual(values[0], es.cv(self.spiketrains[0]))
+        assert_array_almost_equal(windows.magnitude, [[0, 5]])
+
+    def test_cv_timeresolved_few_spikes(self):
+        st = neo.SpikeTrain([0.5, 2.5] * pq.s, t_stop=5 * pq.s)
+        values, windows = es.cv_timeresolved([st, st], win=1 * pq.s)
+        assert_array_almost_equal(values, np.zeros(5))
+        values, windows = es.cv_timeresolved(st, win=3 * pq.s, step=1 * pq.s)
+        assert_array_almost_equal(values, np.zeros(3))
+
+
+class spike_index_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(13)
+        self.sts = [neo.SpikeTrain(
+            np.round(np.sort(np.random.uniform(0, 2, n)), 3), units='s',
+            t_start=0 * pq.s, t_stop=2 * pq.s) for n in [0, 5, 30, 60]]
+        # spikes at t_start and t_stop, and a spike train in ms
+        self.sts.append(neo.SpikeTrain(
+            [0, 3, 499, 500, 2000], units='ms', t_start=0 * pq.ms,
+            t_stop=2000 * pq.ms))
+        self.index = es.spike_index(self.sts)
+
+    def test_spike_counts(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(list(self.index.spike_counts()), [0, 5, 30, 60, 5])
+        counts = self.index.spike_counts(0.5 * pq.s, 1000 * pq.ms)
+        self.assertEqual(list(counts), [len(st.time_slice(
+            0.5 * pq.s, 1 * pq.s)) for st in self.sts])
+        self.assertEqual(es.fanofactor(self.index), es.fanofactor(self.sts))
+
+    def test_cv(self):
+        self.assertEqual(es.cv(self.index), es.cv(self.sts))
+        self.assertTrue(self.index.isis() is self.index.isis())
+
+    def test_peth(self):
+        for w in [1 * pq.ms, 3 * pq.ms, 0.01 * pq.s]:
+            for clip in [False, True]:
+                for t_start, t_stop in [(None, None),
+                                        (0.2 * pq.s, 1500 * pq.ms)]:
+                    hist = es.peth(self.index, w, t_start, t_stop,
+                                   clip=clip)
+                    expected = es.peth(self.sts, w, t_start, t_stop,
+                                       clip=clip)
+                    self.assertEqual(hist.t_start, expected.t_start)
+                    assert_array_almost_equal(hist.magnitude,
+                                              expected.magnitude)
+
+    def test_complexity(self):
+        for w in [1 * pq.ms, 5 * pq.ms]:
+            assert_array_almost_equal(
+                es.complexity_histogram(self.index, w).magnitude,
+                es.complexity_histogram(self.sts, w).magnitude)
+            assert_array_almost_equal(
+                es.complexity(self.index, w, output='counts').magnitude,
+                es.complexity(self.sts, w, output='counts').magnitude)
+
+    def test_different_t_start(self):
+        sts = self.sts + [neo.SpikeTrain([1.5], units='s', t_start=1 * pq.s,
+                                         t_stop=2 * pq.s)]
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            hist = es.peth(es.spike_index(sts), 1 * pq.ms)
+            self.assertEqual(len(w), 1)
+        self.assertEqual(hist.t_start, 1 * pq.s)
+        self.assertEqual(hist.shape[0], 1000)
+
+
+class peth_pyramid_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(17)
+        self.sts = [neo.SpikeTrain(
+            np.sort(np.random.uniform(0, 2, n)), units='s',
+            t_start=0 * pq.s, t_stop=2 * pq.s) for n in [0, 20, 300]]
+        self.sts.append(neo.SpikeTrain(
+            [0, 1, 1.5, 999, 2000], units='ms', t_start=0 * pq.ms,
+            t_stop=2000 * pq.ms))
+        self.ws = [1, 2, 5, 10, 3, 7] * pq.ms
+
+    def test_equal_to_peth(self):
+        for sts in [self.sts, es.spike_index(self.sts)]:
+            for clip in [False, True]:
+                for output in ['counts', 'mean', 'rate']:
+                    hists = es.peth(sts, self.ws, output=output, clip=clip)
+                    self.assertEqual(len(hists), len(self.ws))
+                    for w, hist in zip(self.ws, hists):
+                        expected = es.peth(self.sts, w, output=output,
+                                           clip=clip)
+                        self.assertEqual(hist.sampling_period, w)
+                        self.assertEqual(hist.units, expected.units)
+                        self.assertEqual(hist.shape, expected.shape)
+                        assert_array_almost_equal(hist.magnitude,
+                                                  expected.magnitude)
+
+    def test_window_and_cache(self):
+        pyramid = es.peth_pyramid(self.sts, 0.5 * pq.ms, t_start=0.1 * pq.s,
+                                  t_stop=1900 * pq.ms)
+        hist = pyramid.peth(0.01 * pq.s)
+        assert_array_almost_equal(hist.magnitude, es.peth(
+            self.sts, 10 * pq.ms, t_start=0.1 * pq.s,
+            t_stop=1900 * pq.ms).magnitude)
+        self.assertEqual(hist.t_start, 0.1 * pq.s)
+        self.assertTrue(pyramid.counts(10 * pq.ms) is
+                        pyramid.counts(0.01 * pq.s))
+
+    def test_invalid_width(self):
+        pyramid = es.peth_pyramid(self.sts, 2 * pq.ms)
+        self.assertRaises(ValueError, pyramid.peth, 3 * pq.ms)
+        self.assertRaises(ValueError, pyramid.peth, 1 * pq.ms)
+        self.assertRaises(ValueError, es.peth, self.sts, [2, 5] * pq.ms)
+
+
+class aligned_peth_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(19)
+        self.st = neo.SpikeTrain(
+            np.round(np.sort(np.random.uniform(0, 10, 500)), 3), units='s',
+            t_stop=10 * pq.s)
+        # overlapping windows and windows beyond the spike train
+        self.triggers = [0.05, 1.2, 1.4, 5.02, 9.8] * pq.s
+
+    def _cut_trials(self, t_start, t_stop):
+        return [neo.SpikeTrain(
+            self.st.time_slice(trigger + t_start, trigger + t_stop).view(
+                pq.Quantity) - trigger, t_start=t_start, t_stop=t_stop)
+            for trigger in self.triggers]
+
+    def test_equal_to_peth(self):
+        for w, t_start, t_stop in [(5 * pq.ms, -100 * pq.ms, 0.5 * pq.s),
+                                   (1 * pq.ms, 0 * pq.s, 200 * pq.ms)]:
+            trials = self._cut_trials(t_start, t_stop)
+            for clip in [False, True]:
+                for output in ['counts', 'mean', 'rate']:
+                    hist = es.aligned_peth(self.st, self.triggers, w,
+                                           t_start, t_stop, output=output,
+                                           clip=clip)
+                    expected = es.peth(trials, w, t_start, t_stop,
+                                       output=output, clip=clip)
+                    self.assertEqual(hist.t_start, t_start)
+                    self.assertEqual(hist.units, expected.units)
+                    assert_array_almost_equal(hist.magnitude,
+                                              expected.magnitude)
+
+    def test_trial_counts(self):
+        events = neo.EventArray(self.triggers)
+        hist, counts = es.aligned_peth(
+            self.st, events, 10 * pq.ms, -50 * pq.ms, 250 * pq.ms,
+            trial_counts=True)
+        self.assertEqual(counts.shape, (5, 30))
+        assert_array_almost_equal(counts.sum(axis=0), hist.magnitude.ravel())
+        trials = self._cut_trials(-50 * pq.ms, 250 * pq.ms)
+        for trial, row in zip(trials, counts):
+            assert_array_almost_equal(
+                row, es.peth([trial], 10 * pq.ms).magnitude.ravel())
+
+
+class peth_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.spiketrain_a = neo.SpikeTrain(
+            [0.5, 0.7, 1.2, 3.1, 4.3, 5.5, 6.7] * pq.s, t_stop=10.0 * pq.s)
+        self.spiketrain_b = neo.SpikeTrain(
+            [0.1, 0.7, 1.2, 2.2, 4.3, 5.5, 8.0] * pq.s, t_stop=10.0 * pq.s)
+        self.spiketrains = [self.spiketrain_a, self.spiketrain_b]
+
+    def test_peth_counts(self):
+        res = es.peth(self.spiketrains, 1 * pq.s)
+        targ = np.array([4, 2, 1, 1, 2, 2, 1, 0, 1, 0])
+        assert_array_almost_equal(res.magnitude.ravel(), targ, decimal=9)
+        self.assertEqual(res.t_start, 0 * pq.s)
+        self.assertEqual(res.sampling_period, 1 * pq.s)
+
+    def test_peth_clipped_mean(self):
+        res = es.peth(self.spiketrains, 1 * pq.s, output='mean', clip=True)
+        targ = np.array([2, 2, 1, 1, 2, 2, 1, 0, 1, 0]) / 2.
+        assert_array_almost_equal(res.magnitude.ravel(), targ, decimal=9)
+
+    def test_complexity_histogram(self):
+        st1 = neo.SpikeTrain([0.5, 3.1, 4.3] * pq.s, t_stop=5.0 * pq.s)
+        st2 = neo.SpikeTrain([0.7, 2.2, 4.5] * pq.s, t_stop=5.0 * pq.s)
+        res = es.complexity_histogram([st1, st2], 1 * pq.s)
+        targ = np.array([1, 2, 2])
+        assert_array_almost_equal(res.magnitude.ravel(), targ, decimal=9)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the xcorr module.
+
+:copyright: Copyright 2014 by the Elephant team, see AUTHORS.txt.
+:license: Modified BSD, see LICENSE.txt for details.
+"""
+
+import unittest
+
+import neo
+import numpy as np
+from numpy.testing.utils import assert_array_almost_equal, \
+    assert_array_equal
+import quantities as pq
+
+import elephant.rep as rep
+import elephant.xcorr as xc
+
+
+class corrcoef_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(10)
+        self.binsize = 1 * pq.ms
+        self.spiketrains = [
+            neo.SpikeTrain(np.sort(np.random.uniform(0, 500, n)) * pq.ms,
+                           t_stop=500 * pq.ms) for n in [40, 120, 75, 10]]
+        self.binned = rep.binned_st(
+            self.spiketrains, binsize=self.binsize, t_start=0 * pq.ms,
+            t_stop=500 * pq.ms)
+
+    def test_corrcoef_clipped(self):
+        target = np.corrcoef(self.binned.matrix_clipped())
+        res = xc.corrcoef(self.spiketrains, self.binsize)
+        assert_array_almost_equal(res, target, decimal=10)
+
+    def test_corrcoef_unclipped(self):
+        target = np.corrcoef(self.binned.matrix_unclipped())
+        res = xc.corrcoef(self.spiketrains, self.binsize, clip=False)
+        assert_array_almost_equal(res, target, decimal=10)
+
+    def test_cov(self):
+        target = np.cov(self.binned.matrix_unclipped())
+        res = xc.cov(self.spiketrains, self.binsize, clip=False)
+        assert_array_almost_equal(res, target, decimal=10)
+
+    def test_corrcoef_blocks_float32(self):
+        target = np.corrcoef(self.binned.matrix_clipped())
+        res = xc.corrcoef(self.spiketrains, self.binsize, block_size=3,
+                          dtype=np.float32)
+        self.assertEqual(res.dtype, np.float32)
+        assert_array_almost_equal(res, target, decimal=6)
+        target = np.cov(self.binned.matrix_clipped())
+        res = xc.cov(self.spiketrains, self.binsize, block_size=1,
+                     n_jobs=2)
+        assert_array_almost_equal(res, target, decimal=10)
+
+    def test_corrcoef_n_jobs(self):
+        target = xc.corrcoef(self.spiketrains, self.binsize)
+        res = xc.corrcoef(self.spiketrains, self.binsize, n_jobs=2)
+        assert_array_equal(res, target)
+        self.assertRaises(ValueError, xc.cov, self.spiketrains,
+                          self.binsize, n_jobs=0)
+
+
+class cch_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        self.binsize = 1 * pq.ms
+        self.st_1 = neo.SpikeTrain(
+            np.sort(np.random.uniform(0, 200, 80)) * pq.ms,
+            t_stop=200 * pq.ms)
+        self.st_2 = neo.SpikeTrain(
+            np.sort(np.random.uniform(0, 200, 120)) * pq.ms,
+            t_stop=200 * pq.ms)
+        self.binned_1 = rep.binned_st(self.st_1, binsize=self.binsize,
+                                      t_start=0 * pq.ms, t_stop=200 * pq.ms)
+        self.binned_2 = rep.binned_st(self.st_2, binsize=self.binsize,
+                                      t_start=0 * pq.ms, t_stop=200 * pq.ms)
+
+    def _target(self, hlen, clip=False):
+        if clip:
+            x = self.binned_1.matrix_clipped()[0]
+            y = self.binned_2.matrix_clipped()[0]
+        else:
+            x = self.binned_1.matrix_unclipped()[0]
+            y = self.binned_2.matrix_unclipped()[0]
+        full = np.correlate(y, x, mode='full')
+        center = len(x) - 1
+        return full[center - hlen:center + hlen + 1]
+
+    def test_cchb_methods(self):
+        for hlen in [0, 5, 50, 199]:
+            target = self._target(hlen)
+            for method in ['sparse', 'fft', 'auto']:
+                counts, bin_ids = xc.cchb(self.binned_1, self.binned_2,
+                                          hlen=hlen, method=method)
+                assert_array_almost_equal(counts, target, decimal=10)
+                assert_array_almost_equal(
+                    bin_ids, np.arange(-hlen, hlen + 1), decimal=10)
+
+    def test_cchb_clip(self):
+        target = self._target(20, clip=True)
+        for method in ['sparse', 'fft']:
+            counts, _ = xc.cchb(self.binned_1, self.binned_2, hlen=20,
+                                clip=True, method=method)
+            assert_array_almost_equal(counts, target, decimal=10)
+
+    def test_cchb_arrays(self):
+        x = self.binned_1.matrix_unclipped()[0]
+        y = self.binned_2.matrix_unclipped()[0]
+        for method in ['sparse', 'fft']:
+            counts, _ = xc.cchb(x, y, hlen=10, method=method)
+            assert_array_almost_equal(counts, self._target(10), decimal=10)
+
+    def test_cchb_normed_corrected(self):
+        counts, bin_ids = xc.cchb(self.binned_1, self.binned_2, hlen=10,
+                                  normed=True, corrected=True)
+        self.assertEqual(len(counts), 21)
+        self.assertAlmostEqual(counts[10], 1.)
+
+    def test_cchb_invalid_method(self):
+        self.assertRaises(ValueError, xc.cchb, self.binned_1,
+                          self.binned_2, method='direct')
+
+    def test_cch_methods_agree(self):
+        cch_sparse = xc.cch(self.st_1, self.st_2, self.binsize,
+                            lag=20 * pq.ms, method='sparse')
+        cch_fft = xc.cch(self.st_1, self.st_2, self.binsize,
+                         lag=20 * pq.ms, method='fft')
+        self.assertEqual(len(cch_sparse), 41)
+        assert_array_almost_equal(cch_sparse.magnitude,
+                                  cch_fft.magnitude, decimal=10)
+        assert_array_almost_equal(cch_sparse.magnitude.ravel(),
+                                  self._target(20), decimal=10)
+
+
+class cchb_pairs_TestCase(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(2)
+        self.binsize = 1 * pq.ms
+        self.sts = [neo.SpikeTrain(np.sort(np.random.uniform(0, 500, n)),
+                                   units='ms', t_stop=500 * pq.ms)
+                    for n in [60, 45, 80, 30]]
+        self.binned = rep.binned_st(self.sts, binsize=self.binsize)
+
+    def _target(self, pairs, hlen, clip=False):
+        return np.array([xc.cchb(
+            rep.binned_st([self.sts[i]], binsize=self.binsize),
+            rep.binned_st([self.sts[j]], binsize=self.binsize),
+            hlen=hlen, clip=clip)[0] for i, j in pairs])
+
+    def test_all_pairs(self):
+        pairs = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
+        for method in ['auto', 'sparse', 'fft']:
+            counts, bin_ids = xc.cchb_pairs(self.binned, hlen=15,
+                                            method=method)
+            self.assertEqual(counts.shape, (6, 31))
+            assert_array_almost_equal(bin_ids, np.arange(-15, 16))
+            assert_array_almost_equal(counts, self._target(pairs, 15))
+
+    def test_selected_pairs_clip(self):
+        pairs = [(2, 0), (3, 3)]
+        for method in ['sparse', 'fft']:
+            counts, _ = xc.cchb_pairs(self.binned, pairs=pairs, hlen=5,
+                                      clip=True, method=method)
+            assert_array_almost_equal(counts,
+                                      self._target(pairs, 5, clip=True))
+
+    def test_full_length_out(self):
+        out = np.empty((1, 999))
+        counts, _ = xc.cchb_pairs(self.binned, pairs=[(1, 2)], out=out,
+                                  method='fft')
+        self.assertTrue(counts is out)
+        assert_array_almost_equal(counts, self._target([(1, 2)], None))
+        self.assertRaises(ValueError, xc.cchb_pairs, self.binned,
+                          out=np.empty((6, 5)), hlen=3)
+
+    def test_n_jobs(self):
+        for method in ['sparse', 'fft']:
+            target, _ = xc.cchb_pairs(self.binned, hlen=15, method=method)
+            counts, _ = xc.cchb_pairs(self.binned, hlen=15, method=method,
+                                      n_jobs=3)
+            assert_array_equal(counts, target)
+
+
+class corrcoef_accumulator_TestCase(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(4)
+        self.binsize = 1 * pq.ms
+        self.times = [np.sort(np.random.uniform(0, 0.9, n))
+                      for n in [50, 120, 80]]
+        self.spiketrains = [neo.SpikeTrain(t, units='s', t_stop=0.9 * pq.s)
+                            for t in self.times]
+
+    def _chunk(self, start, stop):
+        return [neo.SpikeTrain(t[(t >= start) & (t < stop)], units='s',
+                               t_start=start * pq.s, t_stop=stop * pq.s)
+                for t in self.times]
+
+    def test_chunks_equal_one_shot(self):
+        for clip in [True, False]:
+            acc = xc.corrcoef_accumulator(self.binsize, clip=clip)
+            for start, stop in [(0, 0.25), (0.25, 0.5), (0.5, 0.9)]:
+                acc.update(self._chunk(start, stop))
+            self.assertEqual(acc.num_bins, 900)
+            assert_array_almost_equal(
+                acc.corrcoef(),
+                xc.corrcoef(self.spiketrains, self.binsize, clip=clip),
+                decimal=12)
+            assert_array_almost_equal(
+                acc.cov(dtype=np.float32),
+                xc.cov(self.spiketrains, self.binsize, clip=clip),
+                decimal=6)
+
+    def test_invalid_chunks(self):
+        acc = xc.corrcoef_accumulator(self.binsize)
+        self.assertRaises(ValueError, acc.corrcoef)
+        acc.update(self._chunk(0, 0.25))
+        self.assertRaises(ValueError, acc.update, self._chunk(0.3, 0.5))
+        self.assertRaises(ValueError, acc.update,
+                          self._chunk(0.25, 0.5)[:2])
+        acc.update(self._chunk(0.25, 0.4005))
+        self.assertRaises(ValueError, acc.update, self._chunk(0.4005, 0.9))
+
+
+class GICs_TestCase(unittest.TestCase):
+    def test_docstring_example(self):
+        links = (1, 2), (1, 3), (1, "b"), (5, "a"), ("a", 2), (1, "a"), \
+            (2, "b")
+        cliques, gics = xc.GICs(links)
+        self.assertEqual(cliques, [[1, 2, 'a'], [1, 2, 'b']])
+        self.assertEqual(gics, [[1, 2, 'a', 'b']])
+
+    def test_cliques_and_gics(self):
+        links = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3), (3, 4),
+                 (0, 4), (1, 4), (1, 9), (2, 9), (9, 10), (5, 6), (6, 7),
+                 (5, 7), (7, 8), (8, 8), (3, 0)]
+        cliques, gics = xc.GICs(links)
+        self.assertEqual(cliques, [[0, 1, 2, 3], [0, 1, 3, 4], [1, 2, 9],
+                                   [5, 6, 7]])
+        self.assertEqual(gics, [[0, 1, 2, 3, 4, 9], [5, 6, 7]])
+
+    def test_no_cliques(self):
+        self.assertEqual(xc.GICs([(0, 1), (1, 2), (2, 3)]), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,15 @@
+import heapq
+import multiprocessing
 import numpy
+import scipy.signal
+import scipy.sparse
 import quantities as pq
 import neo
 import elephant.rep as rep
 
 
 def cchb(x, y, hlen=None, corrected=False, smooth=0, clip=False,
-        normed=False, kernel='boxcar'):
+        normed=False, kernel='boxcar', method='auto'):
     """
     Computes the cross-correlation histogram (CCH) between two binned
     spike trains x and y.
@@ -50,6 +54,19 @@ def cchb(x, y, hlen=None, corrected=False, smooth=0, clip=False,
           * 'hanning': normalized hanning window;
           * 'bartlett': normalized bartlett window;
         Default: 'boxcar'
+    method : str (optional)
+        algorithm used to compute the raw CCH. Can be one of:
+        * 'sparse': for each filled bin of x, the filled bins of y within
+          the CCH window are searched in the sorted bin indices of y. The
+          cost is proportional to the number of spike pairs in the window,
+          which is optimal for sparse spike trains and small hlen.
+        * 'fft': the binned spike trains are correlated via FFT. The cost
+          only depends on the number of bins, which is optimal for dense
+          spike trains and large hlen.
+        * 'auto': chooses between 'sparse' and 'fft' from the expected
+          number of spike pairs, given the number of filled bins, the
+          number of bins and hlen.
+        Default: 'auto'
 
    Returns
    -------
@@ -65,75 +82,42 @@ def cchb(x, y, hlen=None, corrected=False, smooth=0, clip=False,
     TODO: make example!
 
     """
-    if isinstance(x, rep.binned_st):
-        x_filled = x.filled[0]  # Take the indices of the filled bins in x
-        x_mat = x.matrix_clipped()[0] if clip else  x.matrix_unclipped()[0]
-        x_filled_howmany = x_mat[x_filled]
-        del(x_mat)              # Delete big unnecessary object
-    else:
-        # TODO: return error instead
-        if type(x) != numpy.ndarray:
-            x = numpy.array(x)
-        if clip == True:
-            x = 1 * (x > 0)
-        x_filled = numpy.where(x > 0)[0]
-        x_filled_howmany = x[x_filled]
-
-    if isinstance(y, rep.binned_st):
-        y_filled = y.filled[0]  # Take the indices of the filled bins in y
-        y_mat = y.matrix_clipped()[0] if clip else  y.matrix_unclipped()[0]
-        y_filled_howmany = y_mat[y_filled]
-        del(y_mat)             # Delete big unnecessary object
-    else:
-        # TODO: return error instead
-        if type(y) != numpy.ndarray:
-            y = numpy.array(y)
-        if clip == True:
-            y = 1 * (y > 0)
-        y_filled = numpy.where(y > 0)[0]
-        y_filled_howmany = y[y_filled]
-
-    # Take the indices of the filled bins in x and y
-    x_filled = x.filled[0]
-    y_filled = y.filled[0]
-
-    # Compute the binned spike trains
-    x_mat = x.matrix_clipped()[0]
-    y_mat = y.matrix_clipped()[0]
-
-    # Select the filled bins of x and y into a smaller array
-    x_filled_howmany = x_mat[x_filled]
-    y_filled_howmany = y_mat[y_filled]
-
-    # Delete big unnecessary objects
-    del(x_mat, y_mat)
+    # Take the indices of the filled bins of x and y, and how many spikes
+    # fall into them
+    x_filled, x_filled_howmany, x_num_bins = _filled_bins(x, clip)
+    y_filled, y_filled_howmany, y_num_bins = _filled_bins(y, clip)
 
     # Define the half-length of the full crosscorrelogram.
-    Len = x.num_bins + y.num_bins - 1
+    Len = x_num_bins + y_num_bins - 1
     Hlen = Len // 2
     Hbins = Hlen if hlen is None else min(hlen, Hlen)
 
-    # Initialize the counts to an array of zeroes, and the bin ids to
-    counts = numpy.zeros(2 * Hbins + 1)
+    # Initialize the bin ids
     bin_ids = numpy.arange(-Hbins, Hbins + 1)
 
     # Compute the cch at lags in -Hbins,...,Hbins only
-    for r, i in enumerate(x_filled):
-        timediff = y_filled - i
-        timediff_in_range = numpy.all(
-            [timediff >= -Hbins, timediff <= Hbins], axis=0)
-        timediff = (timediff[timediff_in_range]).reshape((-1,))
-        counts[timediff + Hbins] += x_filled_howmany[r] * \
-            y_filled_howmany[timediff_in_range]
+    if method == 'auto':
+        method = _cch_method(len(x_filled), len(y_filled), x_num_bins,
+                             y_num_bins, Hbins)
+    if method == 'sparse':
+        counts = _cch_sparse(x_filled, x_filled_howmany, y_filled,
+                             y_filled_howmany, Hbins)
+    elif method == 'fft':
+        counts = _cch_fft(x_filled, x_filled_howmany, x_num_bins, y_filled,
+                          y_filled_howmany, y_num_bins, Hbins)
+    else:
+        raise ValueError(
+            'method (%s) can be one of the following strings: "auto", '
+            '"fft", "sparse".' % str(method))
 
     # Correct the values taking into account lacking contributes at the edges
     if corrected == True:
         correction = float(Hlen + 1) / numpy.array(
-            Hlen + 1 - abs(numpy.arange(-Hlen, Hlen + 1)), float)
+            Hlen + 1 - abs(bin_ids), float)
         counts = counts * correction
 
     # Define the kernel for smoothing as an ndarray
-    if hasattr(kernel, '__iter__'):
+    if hasattr(kernel, '__iter__') and not isinstance(kernel, str):
         kernel = numpy.array(kernel, dtype=float)
     elif isinstance(kernel, str) and smooth > 1:
         smooth_Nbin = min(int(smooth), Len)
@@ -159,14 +143,107 @@ def cchb(x, y, hlen=None, corrected=False, smooth=0, clip=False,
 
     # Rescale the histogram so that the central bin has height 1, if requested
     if normed == True:
-        counts = numpy.array(counts, float) / float(counts[Hlen])
+        counts = numpy.array(counts, float) / float(counts[Hbins])
 
     # Return only the Hbins bins and counts before and after the central one
     return counts, bin_ids
 
 
+def _filled_bins(x, clip):
+    """
+    Returns the indices of the filled bins of a binned spike train, the
+    number of spikes in each of them (1 if clip is True) and the number of
+    bins. x can be a binned_st (of which the first spike train is taken)
+    or an array of spike counts.
+    """
+    if isinstance(x, rep.binned_st):
+        mat = x.to_sparse(clip=clip)
+        filled = mat.indices[mat.indptr[0]:mat.indptr[1]]
+        filled_howmany = mat.data[mat.indptr[0]:mat.indptr[1]]
+        num_bins = x.num_bins
+    else:
+        # TODO: return error instead
+        x = numpy.asarray(x)
+        if clip == True:
+            x = 1 * (x > 0)
+        filled = numpy.where(x > 0)[0]
+        filled_howmany = x[filled]
+        num_bins = len(x)
+    return filled, filled_howmany, num_bins
+
+
+def _cch_method(x_num_filled, y_num_filled, x_num_bins, y_num_bins, hbins):
+    """
+    Chooses the faster of the methods 'sparse' and 'fft' to compute a CCH
+    with half-length hbins.
+
+    The cost of the sparse method is estimated by the expected number of
+    pairs of filled bins within the CCH window (assuming uniformly filled
+    bins), the cost of the fft method by L*log2(L) for FFTs of length
+    L = x_num_bins + y_num_bins.
+    """
+    num_pairs = x_num_filled * (
+        y_num_filled * (2. * hbins + 1) / max(y_num_bins, 1) + 1)
+    fft_len = x_num_bins + y_num_bins
+    # The sparse method has a larger cost per spike pair than the FFT per
+    # bin, the factor is determined empirically
+    if 4 * num_pairs < fft_len * numpy.log2(max(fft_len, 2)):
+        return 'sparse'
+    return 'fft'
+
+
+def _cch_sparse(x_filled, x_howmany, y_filled, y_howmany, hbins):
+    """
+    Raw CCH at lags -hbins, ..., hbins from the sorted indices of the filled
+    bins of x and y and their spike counts.
+
+    For each filled bin of x, the range of filled bins of y within the CCH
+    window is found by binary search; all pairs in these ranges are then
+    enumerated and histogrammed at once.
+    """
+    lo = numpy.searchsorted(y_filled, x_filled - hbins, side='left')
+    hi = numpy.searchsorted(y_filled, x_filled + hbins, side='right')
+    num_pairs = hi - lo
+    # Position in y_filled of each pair, enumerated consecutively for each
+    # filled bin of x
+    pair_x = numpy.repeat(numpy.arange(len(x_filled)), num_pairs)
+    pair_y = numpy.arange(num_pairs.sum()) + numpy.repeat(
+        lo - numpy.cumsum(num_pairs) + num_pairs, num_pairs)
+    lags = y_filled[pair_y] - x_filled[pair_x]
+    weights = numpy.asarray(
+        x_howmany[pair_x] * y_howmany[pair_y], dtype=float)
+    return numpy.bincount(lags + hbins, weights=weights,
+                          minlength=2 * hbins + 1)
+
+
+def _cch_fft(x_filled, x_howmany, x_num_bins, y_filled, y_howmany,
+             y_num_bins, hbins):
+    """
+    Raw CCH at lags -hbins, ..., hbins computed by FFT correlation of the
+    binned spike trains x and y.
+    """
+    x_dense = numpy.zeros(x_num_bins)
+    x_dense[x_filled] = x_howmany
+    y_dense = numpy.zeros(y_num_bins)
+    y_dense[y_filled] = y_howmany
+    # full[k] is the CCH at lag k - (x_num_bins - 1)
+    full = scipy.signal.fftconvolve(y_dense, x_dense[::-1], mode='full')
+    # Take the lags -hbins, ..., hbins, padding with zeros lags which
+    # cannot be reached
+    counts = numpy.zeros(2 * hbins + 1)
+    lags = numpy.arange(-hbins, hbins + 1)
+    valid = numpy.logical_and(lags > -x_num_bins, lags < y_num_bins)
+    counts[valid] = full[lags[valid] + x_num_bins - 1]
+    # Remove the round-off errors of the FFT if the counts are integers
+    if numpy.issubdtype(numpy.asarray(x_howmany).dtype, numpy.integer) and \
+            numpy.issubdtype(numpy.asarray(y_howmany).dtype, numpy.integer):
+        counts = numpy.round(counts)
+    return counts
+
+
 def ccht(x, y, w, window=None, start=None, stop=None, corrected=False,
-    smooth=None, clip=False, normed=False, xaxis='time', kernel='boxcar'):
+    smooth=None, clip=False, normed=False, xaxis='time', kernel='boxcar',
+    method='auto'):
     """
     Computes the cross-correlation histogram (CCH) between two spike trains.
 
@@ -240,6 +317,10 @@ def ccht(x, y, w, window=None, start=None, stop=None, corrected=False,
           * 'hanning': normalized hanning window;
           * 'bartlett': normalized bartlett window;
         Default: 'boxcar'
+    method : str (optional)
+        algorithm used to compute the CCH, one of 'auto', 'fft' or
+        'sparse' (see cchb()).
+        Default: 'auto'
     xaxis : str (optional)
         whether to return the times or the bin ids as the first output.
         Can be one of:
@@ -308,7 +389,8 @@ def ccht(x, y, w, window=None, start=None, stop=None, corrected=False,
     counts, bin_ids = cchb(
         x_binned, y_binned, corrected=corrected, clip=clip, normed=normed,
         smooth=int((smooth / w).rescale(pq.dimensionless)), kernel=kernel,
-        hlen=int((win / w).rescale(pq.dimensionless).magnitude))
+        hlen=int((win / w).rescale(pq.dimensionless).magnitude),
+        method=method)
 
     # Convert bin ids to times if the latter were requested
     if xaxis == 'time':
@@ -319,7 +401,7 @@ def ccht(x, y, w, window=None, start=None, stop=None, corrected=False,
 
 
 def cch(x, y, w, lag=None, start=None, stop=None, corrected=False,
-    smooth=None, clip=False, normed=False, kernel='boxcar'):
+    smooth=None, clip=False, normed=False, kernel='boxcar', method='auto'):
     """
     Computes the cross-correlation histogram (CCH) between two spike trains,
     or the average CCH between the spike trains in two spike train lists.
@@ -394,6 +476,10 @@ def cch(x, y, w, lag=None, start=None, stop=None, corrected=False,
           * 'hanning': normalized hanning window;
           * 'bartlett': normalized bartlett window;
         Default: 'boxcar'
+    method : str (optional)
+        algorithm used to compute the CCH, one of 'auto', 'fft' or
+        'sparse' (see cchb()).
+        Default: 'auto'
 
     Returns
     -------
@@ -417,7 +503,7 @@ def cch(x, y, w, lag=None, start=None, stop=None, corrected=False,
     if isinstance(x, neo.SpikeTrain) and isinstance(y, neo.SpikeTrain):
         CCH, bins = ccht(x, y, w, window=lag, start=start, stop=stop,
             corrected=corrected, smooth=smooth, clip=clip, normed=normed,
-            xaxis='time', kernel=kernel)
+            xaxis='time', kernel=kernel, method=method)
 
         if not isinstance(CCH, pq.Quantity):
             CCH = CCH * pq.dimensionless
@@ -431,18 +517,250 @@ def cch(x, y, w, lag=None, start=None, stop=None, corrected=False,
             if CCH_exists == False:
                 CCH = cch(xx, yy, w, lag=lag, start=start, stop=stop,
                     corrected=corrected, smooth=smooth, clip=clip,
-                    normed=normed, kernel=kernel)
+                    normed=normed, kernel=kernel, method=method)
                 CCH_exists = True
             else:
                 CCH += cch(xx, yy, w, lag=lag, start=start, stop=stop,
                     corrected=corrected, smooth=smooth, clip=clip,
-                    normed=normed, kernel=kernel)
+                    normed=normed, kernel=kernel, method=method)
         CCH = CCH / float(len(x))
 
         return CCH
 
 
-def corrcoef(spiketrains, binsize, clip=True):
+def cchb_pairs(x, pairs=None, hlen=None, clip=False, method='auto',
+               out=None, n_jobs=1):
+    """
+    Computes the cross-correlation histograms (CCHs) between pairs of
+    spike trains of one binned_st object in a single call.
+
+    For each pair (i, j), the CCH is the same as returned by cchb() for the
+    i-th and j-th binned spike train: bins to the right correspond to spikes
+    of train j following spikes of train i.
+
+    Parameters
+    ----------
+    x : binned_st
+        binned spike trains of the population.
+    pairs : list of pairs of int or None (optional)
+        indices (i, j) of the spike trains in x for which to compute the
+        CCH. If None, all pairs (i, j) with i < j are taken, in the order
+        (0, 1), (0, 2), ..., (0, n-1), (1, 2), ..., (n-2, n-1).
+        Default: None
+    hlen : int or None (optional)
+        histogram half-length. The CCHs have 2*hlen+1 bins (up to the
+        maximum length). If None, the full crosscorrelograms are returned.
+        Default: None
+    clip : bool (optional)
+        whether to clip spikes from the same spike train falling in the
+        same bin.
+        Default: False
+    method : str (optional)
+        algorithm used to compute the CCHs, one of 'auto', 'fft' or
+        'sparse' (see cchb()). With 'fft', the FFT of each spike train is
+        computed only once and reused for all of its pairs.
+        Default: 'auto'
+    out : ndarray or None (optional)
+        array of shape (number of pairs, 2*hlen+1) in which the CCHs are
+        stored, e.g. a numpy.memmap to keep the result on disk. If None, a
+        new array is allocated.
+        Default: None
+    n_jobs : int (optional)
+        number of processes among which the pairs are distributed. The
+        binned spike trains are passed to the processes in shared memory.
+        If -1, all CPUs are used. The result does not depend on n_jobs.
+        Default: 1
+
+    Returns
+    -------
+    counts : ndarray
+        array of shape (number of pairs, 2*hlen+1); counts[k] is the CCH of
+        the k-th pair.
+    bin_ids : ndarray
+        the bin ids (lags) of the CCH bins.
+
+    Example
+    -------
+    >>> import neo, quantities as pq
+    >>> import elephant.rep as rep
+    >>> st1 = neo.SpikeTrain([1.2, 3.5, 8.7, 10.1] * pq.ms, t_stop=15*pq.ms)
+    >>> st2 = neo.SpikeTrain([1.9, 5.2, 8.4] * pq.ms, t_stop=15*pq.ms)
+    >>> st3 = neo.SpikeTrain([2.3, 8.9] * pq.ms, t_stop=15*pq.ms)
+    >>> x = rep.binned_st([st1, st2, st3], binsize=3*pq.ms,
+    ...                   t_start=0*pq.ms, t_stop=15*pq.ms)
+    >>> counts, bin_ids = cchb_pairs(x, hlen=1)
+    >>> print counts
+    [[ 3.  3.  2.]
+     [ 2.  2.  1.]
+     [ 1.  2.  1.]]
+
+    """
+    mat = x.to_sparse(clip=clip)
+    num_trains, num_bins = mat.shape[0], x.num_bins
+
+    if pairs is None:
+        pairs = [(i, j) for i in range(num_trains)
+                 for j in range(i + 1, num_trains)]
+    pairs = numpy.asarray(pairs, dtype=int).reshape((-1, 2))
+
+    # Define the half-length of the full crosscorrelogram, as in cchb()
+    Hlen = (2 * num_bins - 1) // 2
+    Hbins = Hlen if hlen is None else min(hlen, Hlen)
+    bin_ids = numpy.arange(-Hbins, Hbins + 1)
+
+    if out is None:
+        out = numpy.zeros((len(pairs), 2 * Hbins + 1))
+    elif out.shape != (len(pairs), 2 * Hbins + 1):
+        raise ValueError(
+            'out must have shape %s, not %s'
+            % (str((len(pairs), 2 * Hbins + 1)), str(out.shape)))
+
+    if method == 'auto':
+        mean_filled = mat.nnz / float(max(num_trains, 1))
+        method = _cch_method(mean_filled, mean_filled, num_bins, num_bins,
+                             Hbins)
+    if method not in ('sparse', 'fft'):
+        raise ValueError(
+            'method (%s) can be one of the following strings: "auto", '
+            '"fft", "sparse".' % str(method))
+
+    csr = (mat.indptr, mat.indices, mat.data)
+    if _num_jobs(n_jobs) == 1 or len(pairs) < 2:
+        _cch_pairs(csr, num_bins, pairs, Hbins, method, out)
+    else:
+        # Shard the pairs in contiguous blocks, so that the results can be
+        # written back in order; pairs sharing spike trains stay together
+        bounds = _shard_bounds(len(pairs), 4 * _num_jobs(n_jobs))
+        tasks = [(_cch_pairs_shard,
+                  (num_bins, pairs[a:b], Hbins, method)) for a, b in bounds]
+        for (a, b), counts in zip(bounds, _map_shared(csr, tasks, n_jobs)):
+            out[a:b] = counts
+
+    return out, bin_ids
+
+
+def _cch_pairs(csr, num_bins, pairs, hbins, method, out):
+    """
+    Raw CCHs at lags -hbins, ..., hbins of the given pairs of rows of a
+    CSR matrix of spike counts, given by its arrays (indptr, indices, data).
+    The CCHs are written into out.
+    """
+    indptr, indices, data = csr
+    if method == 'sparse':
+        for k, (i, j) in enumerate(pairs):
+            out[k] = _cch_sparse(
+                indices[indptr[i]:indptr[i + 1]],
+                data[indptr[i]:indptr[i + 1]],
+                indices[indptr[j]:indptr[j + 1]],
+                data[indptr[j]:indptr[j + 1]], hbins)
+    else:
+        # The FFT length avoids circular wrapping for lags up to hbins
+        nfft = 2 ** int(numpy.ceil(numpy.log2(num_bins + hbins)))
+        # FFT of each spike train occurring in pairs, computed once
+        trains, pos = numpy.unique(pairs, return_inverse=True)
+        pos = pos.reshape(pairs.shape)
+        spectra = numpy.empty((len(trains), nfft // 2 + 1), dtype=complex)
+        row = numpy.zeros(num_bins)
+        for k, i in enumerate(trains):
+            row[:] = 0
+            row[indices[indptr[i]:indptr[i + 1]]] = \
+                data[indptr[i]:indptr[i + 1]]
+            spectra[k] = numpy.fft.rfft(row, nfft)
+        # Correlate chunks of pairs at once; negative lags are at the end
+        lag_idx = numpy.arange(-hbins, hbins + 1) % nfft
+        chunk = max(1, 2 ** 22 // nfft)
+        for start in range(0, len(pairs), chunk):
+            p = pos[start:start + chunk]
+            corr = numpy.fft.irfft(
+                numpy.conj(spectra[p[:, 0]]) * spectra[p[:, 1]], nfft,
+                axis=1)
+            out[start:start + chunk] = numpy.round(corr[:, lag_idx])
+    return out
+
+
+def _cch_pairs_shard(csr, num_bins, pairs, hbins, method):
+    """
+    Worker task of cchb_pairs(): raw CCHs of a block of pairs.
+    """
+    out = numpy.empty((len(pairs), 2 * hbins + 1))
+    return _cch_pairs(csr, num_bins, pairs, hbins, method, out)
+
+
+def _num_jobs(n_jobs):
+    """
+    Number of processes to use for n_jobs (all CPUs if n_jobs is -1).
+    """
+    if n_jobs == -1:
+        return multiprocessing.cpu_count()
+    if n_jobs < 1:
+        raise ValueError('n_jobs (%s) must be -1 or a positive integer'
+                         % str(n_jobs))
+    return int(n_jobs)
+
+
+def _shard_bounds(n, num_shards):
+    """
+    Bounds (start, stop) of at most num_shards contiguous blocks covering
+    range(n).
+    """
+    edges = numpy.unique(numpy.linspace(0, n, min(n, num_shards) + 1)
+                         .astype(int))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+# Arrays shared with the worker processes, set by _init_worker()
+_worker_arrays = None
+
+
+def _to_shared(a):
+    """
+    Copies the array a into a shared memory buffer. Returns the buffer,
+    the dtype and the length of a, from which _from_shared() rebuilds it.
+    """
+    a = numpy.ascontiguousarray(a)
+    # Empty buffers cannot be mapped by numpy.frombuffer()
+    buf = multiprocessing.RawArray('b', max(a.nbytes, 1))
+    numpy.frombuffer(buf, dtype='b')[:a.nbytes] = a.view('b')
+    return buf, a.dtype.str, len(a)
+
+
+def _from_shared(shared):
+    buf, dtype, size = shared
+    return numpy.frombuffer(buf, dtype=dtype)[:size]
+
+
+def _init_worker(shared):
+    global _worker_arrays
+    _worker_arrays = tuple(_from_shared(sh) for sh in shared)
+
+
+def _run_worker_task(task):
+    func, args = task
+    return func(_worker_arrays, *args)
+
+
+def _map_shared(arrays, tasks, n_jobs):
+    """
+    Runs the tasks (func, args) in a pool of n_jobs processes, calling
+    func(arrays, *args), where arrays is a tuple of 1D numpy arrays passed
+    to the processes in shared memory instead of being pickled for each
+    task. Yields the results in the order of the tasks, as they become
+    available.
+    """
+    shared = tuple(_to_shared(a) for a in arrays)
+    pool = multiprocessing.Pool(min(_num_jobs(n_jobs), len(tasks)),
+                                initializer=_init_worker,
+                                initargs=(shared,))
+    try:
+        for result in pool.imap(_run_worker_task, tasks, chunksize=1):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def corrcoef(spiketrains, binsize, clip=True, n_jobs=1, block_size=None,
+             dtype=float):
     '''
     Matrix of pairwise Pearson's correlation coefficients for a list of
     spike trains.
@@ -471,6 +789,16 @@ def corrcoef(spiketrains, binsize, clip=True):
         whether to clip spikes of the same spike train falling in the same
         bin (True) or not (False). If True, the binned spike trains are
         binary arrays
+    n_jobs : int, optional
+        number of processes among which the rows of the matrix are
+        distributed. If -1, all CPUs are used. Default: 1
+    block_size : int or None, optional
+        if given, the matrix is computed in blocks of block_size rows, so
+        that the intermediate float64 products take O(block_size * n)
+        instead of O(n**2) memory. Default: None
+    dtype : dtype, optional
+        data type of the returned matrix, e.g. numpy.float32 to halve the
+        memory needed for many spike trains. Default: float
 
     Output
     ------
@@ -492,17 +820,15 @@ def corrcoef(spiketrains, binsize, clip=True):
     binned_sts = rep.binned_st(
         spiketrains, binsize=binsize, t_start=t_start, t_stop=t_stop)
 
-    # Create the binary matrix M of binned spike trains
-    if clip is True:
-        M = binned_sts.matrix_clipped()
-    else:
-        M = binned_sts.matrix_unclipped()
+    # Create the sparse matrix M of binned spike trains (binary if clipped)
+    M = binned_sts.to_sparse(clip=clip is True)
 
     # Return the matrix of correlation coefficients
-    return numpy.corrcoef(M)
+    return _sparse_cov(M, n_jobs, block_size, dtype, normed=True)
 
 
-def cov(spiketrains, binsize, clip=True):
+def cov(spiketrains, binsize, clip=True, n_jobs=1, block_size=None,
+        dtype=float):
     '''
     Matrix of pairwise covariance coefficients for a list of spike trains.
 
@@ -528,6 +854,16 @@ def cov(spiketrains, binsize, clip=True):
         whether to clip spikes of the same spike train falling in the same
         bin (True) or not (False). If True, the binned spike trains are
         binary arrays
+    n_jobs : int, optional
+        number of processes among which the rows of the matrix are
+        distributed. If -1, all CPUs are used. Default: 1
+    block_size : int or None, optional
+        if given, the matrix is computed in blocks of block_size rows, so
+        that the intermediate float64 products take O(block_size * n)
+        instead of O(n**2) memory. Default: None
+    dtype : dtype, optional
+        data type of the returned matrix, e.g. numpy.float32 to halve the
+        memory needed for many spike trains. Default: float
 
     Output
     ------
@@ -549,14 +885,199 @@ def cov(spiketrains, binsize, clip=True):
     binned_sts = rep.binned_st(
         spiketrains, binsize=binsize, t_start=t_start, t_stop=t_stop)
 
-    # Create the binary matrix M of binned spike trains
-    if clip is True:
-        M = binned_sts.matrix_clipped()
+    # Create the sparse matrix M of binned spike trains (binary if clipped)
+    M = binned_sts.to_sparse(clip=clip is True)
+
+    # Return the matrix of covariance coefficients
+    return _sparse_cov(M, n_jobs, block_size, dtype)
+
+
+def _sparse_cov(M, n_jobs=1, block_size=None, dtype=float, normed=False):
+    '''
+    Covariance matrix of the rows of a sparse matrix M of spike counts,
+    with the same normalization (by T-1) as numpy.cov(), or the matrix of
+    correlation coefficients if normed is True.
+
+    The covariance is obtained from the sparse product M*M^T and the row
+    sums of M, so that M is never converted to a dense matrix:
+
+             C[i,j] = (<b_i, b_j> - T * m_i * m_j) / (T - 1),
+
+    where T is the number of bins. The product is computed in blocks of
+    block_size rows (one block per process if n_jobs > 1 and block_size
+    is None), each block being normalized and stored in the result of the
+    given dtype before the next one is computed.
+    '''
+    N, T = M.shape
+    sums = numpy.asarray(M.sum(axis=1), dtype=float).ravel()
+    sq_sums = None
+    if normed:
+        sq_sums = numpy.asarray(M.multiply(M).sum(axis=1),
+                                dtype=float).ravel()
+
+    if block_size is None:
+        num_blocks = _num_jobs(n_jobs)
+    else:
+        num_blocks = int(numpy.ceil(N / float(max(block_size, 1))))
+    bounds = _shard_bounds(N, num_blocks)
+    if _num_jobs(n_jobs) == 1 or len(bounds) < 2:
+        blocks = (_gram_rows_shard((M.indptr, M.indices, M.data), M.shape,
+                                   a, b) for a, b in bounds)
     else:
-        M = binned_sts.matrix_unclipped()
+        # Each process computes the products of a block of rows with M
+        tasks = [(_gram_rows_shard, (M.shape, a, b)) for a, b in bounds]
+        blocks = _map_shared((M.indptr, M.indices, M.data), tasks, n_jobs)
 
-    # Return the matrix of correlation coefficients
-    return numpy.cov(M)
+    return _normalize_cov(blocks, bounds, sums, sq_sums, T, dtype)
+
+
+def _normalize_cov(blocks, bounds, sums, sq_sums, T, dtype):
+    '''
+    Covariance matrix (or matrix of correlation coefficients if the sums
+    of squares sq_sums are given) of T bins from the blocks of rows
+    bounds[k] of the matrix of scalar products of the binned spike trains
+    and their sums. The blocks are modified in place.
+    '''
+    means = sums / T
+    if sq_sums is not None:
+        std = numpy.sqrt((sq_sums - T * means ** 2) / (T - 1))
+    C = numpy.empty((len(sums), len(sums)), dtype=dtype)
+    for (a, b), prod in zip(bounds, blocks):
+        prod -= T * numpy.outer(means[a:b], means)
+        prod /= T - 1
+        if sq_sums is not None:
+            prod /= numpy.outer(std[a:b], std)
+        C[a:b] = prod
+    return C
+
+
+class corrcoef_accumulator(object):
+    '''
+    Incremental computation of corrcoef() and cov() over consecutive time
+    chunks of the same spike trains, e.g. windows of a long recording
+    loaded one after the other.
+
+    Each chunk is binned on its own, and only the sums and the scalar
+    products of the binned spike trains are kept, so that the memory does
+    not depend on the duration of the recording. The result is the same as
+    the one of corrcoef() and cov() for the whole recording, provided the
+    chunks are contiguous and their boundaries fall on bin edges (except
+    for the end of the last chunk).
+
+    Parameters
+    ----------
+    binsize : Quantity
+        the bin size used to bin the spike trains
+    clip : bool, optional
+        whether to clip spikes of the same spike train falling in the same
+        bin (True) or not (False). Default: True
+
+    Attributes
+    ----------
+    num_bins : int
+        total number of bins of the chunks added so far
+    t_start, t_stop : Quantity or None
+        start and stop time of the chunks added so far
+
+    Example
+    -------
+    >>> acc = corrcoef_accumulator(binsize=1 * pq.ms)
+    >>> for chunk in chunks:  # lists of SpikeTrains of 60 s windows
+    ...     acc.update(chunk)
+    >>> C = acc.corrcoef()
+    '''
+
+    def __init__(self, binsize, clip=True):
+        self.binsize = binsize
+        self.clip = clip
+        self.num_bins = 0
+        self.t_start = None
+        self.t_stop = None
+        self._sums = None
+        self._prods = None
+        self._partial_bin = False
+
+    def update(self, spiketrains):
+        '''
+        Adds a time chunk of the spike trains.
+
+        Parameters
+        ----------
+        spiketrains : list
+            a list of SpikeTrains with same t_start and t_stop values,
+            which are the boundaries of the chunk. The spike trains must
+            be given in the same order for all chunks.
+        '''
+        # Check that all spike trains have same t_start and t_stop
+        t_start = spiketrains[0].t_start
+        t_stop = spiketrains[0].t_stop
+        assert(all([st.t_start == t_start for st in spiketrains[1:]]))
+        assert(all([st.t_stop == t_stop for st in spiketrains[1:]]))
+        if self.t_stop is not None:
+            if t_start != self.t_stop:
+                raise ValueError(
+                    'chunk starts at %s, the previous one stopped at %s'
+                    % (t_start, self.t_stop))
+            if self._partial_bin:
+                raise ValueError(
+                    'the previous chunk does not stop at a bin edge')
+            if len(spiketrains) != len(self._sums):
+                raise ValueError(
+                    'chunk has %d spike trains instead of %d'
+                    % (len(spiketrains), len(self._sums)))
+
+        binned_sts = rep.binned_st(
+            spiketrains, binsize=self.binsize, t_start=t_start,
+            t_stop=t_stop)
+        M = binned_sts.to_sparse(clip=self.clip is True)
+        sums = numpy.asarray(M.sum(axis=1), dtype=numpy.int64).ravel()
+        prods = numpy.asarray((M * M.T).toarray(), dtype=numpy.int64)
+        if self._sums is None:
+            self._sums, self._prods = sums, prods
+            self.t_start = t_start
+        else:
+            self._sums += sums
+            self._prods += prods
+        self.t_stop = t_stop
+        self.num_bins += binned_sts.num_bins
+        ratio = float(((t_stop - t_start) / self.binsize).simplified)
+        self._partial_bin = abs(ratio - binned_sts.num_bins) > \
+            1e-9 * max(ratio, 1)
+        return self
+
+    def cov(self, dtype=float):
+        '''
+        Matrix of pairwise covariance coefficients of the spike trains
+        over all the chunks added so far (see cov()).
+        '''
+        return self.__normalize(dtype, normed=False)
+
+    def corrcoef(self, dtype=float):
+        '''
+        Matrix of pairwise Pearson's correlation coefficients of the spike
+        trains over all the chunks added so far (see corrcoef()).
+        '''
+        return self.__normalize(dtype, normed=True)
+
+    def __normalize(self, dtype, normed):
+        if self._sums is None:
+            raise ValueError('no chunk was added')
+        sq_sums = None
+        if normed:
+            sq_sums = numpy.diag(self._prods).astype(float)
+        return _normalize_cov(
+            [self._prods.astype(float)], [(0, len(self._sums))],
+            self._sums.astype(float), sq_sums, self.num_bins, dtype)
+
+
+def _gram_rows_shard(csr, shape, start, stop):
+    """
+    Worker task of _sparse_cov(): dense products of the rows start:stop of
+    the CSR matrix given by (indptr, indices, data) with all of its rows.
+    """
+    indptr, indices, data = csr
+    M = scipy.sparse.csr_matrix((data, indices, indptr), shape=shape)
+    return numpy.asarray((M[start:stop] * M.T).toarray(), dtype=float)
 
 
 def ccht2(x, y, binsize, corrected=False, smooth=0, normed=False,
@@ -678,98 +1199,140 @@ def GICs(links):
           Tags must be hashable objects, such as floats, strings, tuples.
 
     **OUTPUT**:
-      (cliques, GICs): the cliques and GICs of the graph.
+      (cliques, GICs): the cliques and GICs of the graph. Cliques are the
+      maximal groups of at least 3 all-to-all connected vertices, largest
+      first.
 
     *************************************************************************
     Example:
 
     >>> links = (1,2), (1,3), (1,"b"), (5, "a"), ("a", 2), (1, "a"), (2,"b")
     >>> print GICs(links)
+    ([[1, 2, 'a'], [1, 2, 'b']], [[1, 2, 'a', 'b']])
 
     *************************************************************************
 
     """
 
-    # Collect the tags of all elements in conns:
-    tags = []
-    for link in links: tags.extend(link)
-    tags = list(set(tags))
+    # Collect the tags of all elements in links, sorted if possible
+    tags = list(set(tag for link in links for tag in link))
+    try:
+        tags.sort()
+    except TypeError:
+        tags.sort(key=lambda tag: (type(tag).__name__, repr(tag)))
 
-    # Map the original tags into integer ids 0,1,2,..., which have an
-    # ordering and can be used to avoid redundant searches
+    # Map the original tags into integer ids 0,1,2,..., which can be used
+    # as indices of the adjacency sets
     Map = {}
-    for i, tag in enumerate(tags): Map[tag] = i
-
-
-    # Use the map to convert the links into the new integer ids
-    links_mapped = set([frozenset((Map[link[0]], Map[link[1]])) for link in links])
-
-    # Define the list of integer IDs and its length
-    ids = range(len(tags))
-    Lids = len(ids)
-
-    # For each ID i, compute the list conns[i] of larger IDs connected to it
-    conns = [[] for i in xrange(Lids-1)]
-    for id1 in ids:
-        for id2 in ids[id1+1:]:
-            if set([id1, id2]) in links_mapped: conns[id1].append(id2)
-
-    # Compute the list "tuples" of all cliques, size by size:
-    # * tuples[0] contains cliques of size 2 (i.e. the original links)
-    # * tuples[1] contains cliques of size 3,
-    # * ...
-    tuples = [[] for i in xrange(Lids-1)]
-    for i in xrange(Lids-2, -1, -1):
-        current_id = ids[i]
-        current_conns = conns[i]
-        if current_conns == []:
-	    pass
-        else:
-            current_tuples = [[] for j in xrange(len(current_conns))]
-            current_tuples[0] = [[current_id,j] for j in current_conns]
-            for j in current_conns:
-                tuples[0].append([current_id,j])
-            p = 0
-            while p < len(current_conns): #-1?
-                for j in xrange(len(current_tuples[p])-1):
-                    for k in xrange(j+1, len(current_tuples[p])):
-		        I = list(set(current_tuples[p][j]) & set(current_tuples[p][j]))
-		        #D = list_simmdiff(current_tuples[p][j], current_tuples[p][k])
-			D = list(set([item for item in current_tuples[p][j] if not item in current_tuples[p][k]]) \
-                            | set([item for item in current_tuples[p][k] if not item in current_tuples[p][j]]))
-		        if D in tuples[len(D)-2]:
-		            U = list(set(I) | set(D))
-		            if U not in tuples[len(U)-2]:
-			        tuples[len(U)-2].append(U)
-		            if U not in current_tuples[len(U)-2]:
-			        current_tuples[len(U)-2].append(U)
-                p +=1
-
-    # Compute the cliques of all-to-all connected MUAs, throwing away from
-    # "tuples" sub-sliques included into larger ones
-    cliques = []
-    for tups in tuples[:0:-1]:
-        for t in tups:
-            if all([any([item not in i for item in t]) for i in cliques]):
-	        cliques.append(sorted(t))
-
-    # Construct GICs as groups of cliques having at least one MUA in common.
-    GIC = [[j for j in i] for i in cliques]
-    j=0
-    while j < len(GIC)-1:
-        k = 1
-        while j+k < len(GIC):
-            if list(set(GIC[j]) & set(GIC[j+k])) != []:
-	        GIC[j] = sorted(set(GIC[j]) | set(GIC[j+k]))
-	        fake = GIC.pop(j+k)
-	        k = 0
-	    k += 1
-        j += 1
+    for i, tag in enumerate(tags):
+        Map[tag] = i
+
+    # For each ID i, compute the set adj[i] of IDs connected to it
+    adj = [set() for i in range(len(tags))]
+    for link in links:
+        id1, id2 = Map[link[0]], Map[link[1]]
+        if id1 != id2:
+            adj[id1].add(id2)
+            adj[id2].add(id1)
+
+    # Compute the cliques of all-to-all connected vertices (of 3 or more
+    # vertices), largest first
+    cliques = sorted((sorted(c) for c in _maximal_cliques(adj, 3)),
+                     key=lambda c: (-len(c), c))
+
+    # Construct GICs as groups of cliques having at least one vertex in
+    # common, by merging the vertices of each clique with union-find
+    parent = list(range(len(tags)))
+    for clique in cliques:
+        root = _find_root(parent, clique[0])
+        for i in clique[1:]:
+            parent[_find_root(parent, i)] = root
+    GIC, GIC_of_root = [], {}
+    for clique in cliques:
+        root = _find_root(parent, clique[0])
+        if root not in GIC_of_root:
+            GIC_of_root[root] = len(GIC)
+            GIC.append(set())
+        GIC[GIC_of_root[root]].update(clique)
 
     # Map the clique and GIC ids back to the original tags
-    cliques_tagged, GICs_tagged = [], []
-    for clique in cliques: cliques_tagged.append([tags[i] for i in clique])
-    for gic in GIC: GICs_tagged.append([tags[i] for i in gic])
+    cliques_tagged = [[tags[i] for i in clique] for clique in cliques]
+    GICs_tagged = [[tags[i] for i in sorted(gic)] for gic in GIC]
 
     # Return cliques and GICs
     return cliques_tagged, GICs_tagged
+
+
+def _maximal_cliques(adj, min_size=1):
+    """
+    Returns the maximal cliques of at least min_size vertices of the graph
+    given by the adjacency sets adj, where adj[i] is the set of vertices
+    connected to vertex i.
+
+    Uses the Bron-Kerbosch algorithm with pivoting, starting from the
+    vertices in a degeneracy ordering, so that each top-level search is
+    restricted to the (few) later neighbours of the vertex.
+    """
+    cliques = []
+    order = _degeneracy_order(adj)
+    position = [0] * len(adj)
+    for k, v in enumerate(order):
+        position[v] = k
+    for v in order:
+        later = set(u for u in adj[v] if position[u] > position[v])
+        _bron_kerbosch([v], later, adj[v] - later, adj, min_size, cliques)
+    return cliques
+
+
+def _bron_kerbosch(R, P, X, adj, min_size, cliques):
+    """
+    Appends to cliques the maximal cliques of at least min_size vertices
+    which contain all vertices of R, some of P and none of X.
+    """
+    if not P:
+        if not X and len(R) >= min_size:
+            cliques.append(R)
+        return
+    if len(R) + len(P) < min_size:
+        return
+    # The pivot u maximizes the number of candidates skipped: each maximal
+    # clique contains either u or one of its non-neighbours
+    u = max(P | X, key=lambda w: len(P & adj[w]))
+    for v in list(P - adj[u]):
+        _bron_kerbosch(R + [v], P & adj[v], X & adj[v], adj, min_size,
+                       cliques)
+        P.remove(v)
+        X.add(v)
+
+
+def _degeneracy_order(adj):
+    """
+    Orders the vertices of the graph given by the adjacency sets adj by
+    repeatedly removing a vertex of minimum degree.
+    """
+    degree = [len(a) for a in adj]
+    heap = [(d, v) for v, d in enumerate(degree)]
+    heapq.heapify(heap)
+    removed = [False] * len(adj)
+    order = []
+    while heap:
+        d, v = heapq.heappop(heap)
+        if removed[v] or d != degree[v]:
+            continue
+        removed[v] = True
+        order.append(v)
+        for u in adj[v]:
+            if not removed[u]:
+                degree[u] -= 1
+                heapq.heappush(heap, (degree[u], u))
+    return order
+
+
+def _find_root(parent, i):
+    """
+    Root of the set of i in the union-find forest parent (path halving).
+    """
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i